@@ -1,10 +1,21 @@
 import streamlit as st
 import os
-import pdfplumber
-from pptx import Presentation
-from extract_sections import extract_sections_and_images
-from summarize_sections import summarize_sections, send_to_mistral_for_bullet_points
-from pptx_exp import create_presentation
+import io
+import json
+import time
+import hashlib
+from pdf_document import ParsedDocument
+from page_cache import PageCache
+from extract_sections import IMAGE_RESOLUTION
+from summarize_sections import TOP_SENTENCES, MAX_CHUNK_CHARS, BULLET_POINT_BATCH_SECTION_TOKENS
+from result_cache import ResultCache
+from llm_cache import LLMCache
+from slide_images import ImagePreparer
+from mistral_summarizer import PROMPT_VERSION, MISTRAL_MODEL, CONTEXT_WINDOW, CONTEXT_HEADROOM, MAX_OUTPUT_TOKENS, \
+    TEMPERATURE
+from pipeline import generate_presentation_from_pdf
+from jobs import JobManager
+from instrumentation import configure_instrumentation
 from PIL import Image
 
 # Define available fonts and templates
@@ -13,34 +24,133 @@ font_choices = ["Arial", "Calibri", "Times New Roman", "Verdana", "Georgia"]
 # Path where templates are stored
 TEMPLATE_DIR = "D:/python/Projects/slide_generation/last_hope/templates"  # Change this to your actual template directory
 UPLOAD_DIR = "uploads"  # Directory for saving uploaded PDFs
+PAGE_CACHE_DIR = "page_cache"  # Per-page extraction results, reused across re-uploads of edited PDFs
+PAGE_CACHE_MAX_BYTES = 2 << 30
+RESULT_CACHE_DIR = "result_cache"  # Whole-document results, reused when the same PDF is uploaded again
+RESULT_CACHE_MAX_BYTES = 2 << 30
+PREVIEW_RESOLUTION = 50  # DPI of preview thumbnails
+PREVIEW_PAGE_SIZE = 6  # Thumbnails per preview page
+PREVIEW_COLUMNS = 3
+JOBS_DIR = "jobs"  # Per-job working directories (extracted images, generated deck)
+GENERATION_WORKERS = 2  # Presentations generated concurrently; further jobs wait in the queue
+EXTRACTION_WORKERS = max(1, (os.cpu_count() or 1) // GENERATION_WORKERS)  # Processes per job for PDF extraction
+JOB_POLL_INTERVAL = 1.0  # Seconds between progress refreshes while a job is running
+SUMMARIZER_BACKEND = "spacy"  # "spacy" (word vectors) or "tfidf" (no language model, far less memory)
+LLM_CACHE_PATH = "llm_cache/responses.sqlite3"  # Mistral responses, reused whenever the same summary is sent again
+LLM_CACHE_TTL = 30 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 100000
+LLM_CONCURRENCY = 4  # Bullet point requests in flight per job; match the Ollama server's parallel slots
+LOG_LEVEL = "INFO"
+SPANS_PATH = "logs/spans.jsonl"  # Timing, CPU and memory of every pipeline stage, one JSON object per line
+METRICS_PORT = None  # Set to e.g. 9464 to serve the span metrics at http://127.0.0.1:9464/metrics
+LLM_BATCH_TOKENS = 1500  # Very short sections are packed into bullet point requests of up to this many tokens
+IMAGE_CACHE_DIR = "image_cache"  # Images downsampled and recompressed for their slide boxes
+SLIDE_IMAGE_DPI = 150  # Resolution images are embedded at, relative to their size on the slide
+
+# Everything that changes the extracted, summarized or bulleted output; part of the result cache key
+PIPELINE_SETTINGS = {
+    "image_resolution": IMAGE_RESOLUTION,
+    "summarizer": SUMMARIZER_BACKEND,
+    "summarizer_version": 3,
+    "top_sentences": TOP_SENTENCES,
+    "max_chunk_chars": MAX_CHUNK_CHARS,
+    "llm_model": MISTRAL_MODEL,
+    "llm_prompt_version": PROMPT_VERSION,
+    "llm_context_window": CONTEXT_WINDOW,
+    "llm_context_headroom": CONTEXT_HEADROOM,
+    "llm_max_output_tokens": MAX_OUTPUT_TOKENS,
+    "llm_temperature": TEMPERATURE,
+    "llm_batch_tokens": LLM_BATCH_TOKENS,
+    "llm_batch_section_tokens": BULLET_POINT_BATCH_SECTION_TOKENS,
+    "llm_concurrency": LLM_CONCURRENCY,  # Sets how many packed requests short sections are spread over
+}
 
 # List of available PPTX templates
 pptx_files = [f for f in os.listdir(TEMPLATE_DIR) if f.endswith('.pptx')]
 
-# Function to convert PDF pages to images and display them
-def display_pdf_as_images(pdf_path):
-    images = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages):
-            st.write(f"Displaying page {i + 1}...")
-            page_image = page.to_image(resolution=300)
-            img_path = os.path.join(UPLOAD_DIR, f"page_{i+1}.png")
-            page_image.save(img_path)
-            images.append(img_path)
-            st.image(img_path, caption=f"Page {i + 1}", use_column_width=True)
-    return images
-
-# Function to update the title in the first slide
-def update_presentation_title(prs, new_title):
-    # Access the first slide (usually the title slide)
-    first_slide = prs.slides[0]
-    # Access the title placeholder (placeholder 0)
-    title_placeholder = first_slide.shapes.title
-    if title_placeholder is not None:
-        title_placeholder.text = new_title
+# Render one preview thumbnail; memoized by file hash and page number across reruns
+@st.cache_data(max_entries=2000, show_spinner=False)
+def render_preview_page(file_hash, page_num, resolution, _document):
+    page_image = _document.render_page(page_num, resolution=resolution)
+    buffer = io.BytesIO()
+    page_image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+# Function to show a paginated preview, rendering only the pages currently shown
+def display_pdf_preview(document, file_hash):
+    page_count = len(document)
+    preview_page_count = max(1, -(-page_count // PREVIEW_PAGE_SIZE))
+    preview_page = 1
+    if preview_page_count > 1:
+        preview_page = st.number_input(f"Preview page (1-{preview_page_count})", min_value=1,
+                                       max_value=preview_page_count, value=1, step=1)
+
+    first_page = (preview_page - 1) * PREVIEW_PAGE_SIZE
+    columns = st.columns(PREVIEW_COLUMNS)
+    for i in range(first_page, min(first_page + PREVIEW_PAGE_SIZE, page_count)):
+        thumbnail = render_preview_page(file_hash, i, PREVIEW_RESOLUTION, document)
+        columns[(i - first_page) % PREVIEW_COLUMNS].image(thumbnail, caption=f"Page {i + 1}",
+                                                          use_column_width=True)
+
+# Logging and span output are set up once per server process
+@st.cache_resource
+def setup_instrumentation():
+    return configure_instrumentation(LOG_LEVEL, spans_path=SPANS_PATH, metrics_port=METRICS_PORT)
+
+# One job pool per server process, shared by all sessions
+@st.cache_resource
+def get_job_manager():
+    return JobManager(max_workers=GENERATION_WORKERS, jobs_dir=JOBS_DIR)
+
+# One response cache shared by all sessions and jobs
+@st.cache_resource
+def get_llm_cache():
+    return LLMCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+
+# Runs in a worker thread: no Streamlit calls in here
+def run_generation_job(work_dir, progress, partial, pdf_path, template_path, selected_font, presentation_name, llm_cache):
+    output_path = os.path.join(work_dir, f"{presentation_name or 'presentation'}.pptx")
+    return generate_presentation_from_pdf(
+        pdf_path, template_path, output_path, selected_font, presentation_name,
+        work_dir=work_dir,
+        settings=PIPELINE_SETTINGS,
+        result_cache=ResultCache(RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES),
+        page_cache=PageCache(PAGE_CACHE_DIR, max_bytes=PAGE_CACHE_MAX_BYTES),
+        progress=progress,
+        summarizer=SUMMARIZER_BACKEND,
+        llm_concurrency=LLM_CONCURRENCY,
+        on_partial_bullets=partial,
+        llm_cache=llm_cache,
+        llm_batch_tokens=LLM_BATCH_TOKENS,
+        image_preparer=ImagePreparer(IMAGE_CACHE_DIR, dpi=SLIDE_IMAGE_DPI),
+        workers=EXTRACTION_WORKERS,
+    )
+
+# Show the state of this session's job; keeps rerunning the script while the job is in progress
+def display_job_status(job):
+    if job.status == "failed":
+        st.error(f"Presentation generation failed: {job.error}")
+    elif job.status == "done":
+        st.write("Your presentation is ready for download.")
+        with open(job.result, "rb") as f:
+            st.download_button(
+                label="Download Presentation",
+                data=f,
+                file_name=os.path.basename(job.result),
+                mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
+            )
+    else:
+        st.progress(job.progress, text=job.stage)
+        # Bullet points appear section by section while Mistral is still generating them
+        for section, bullet_points in dict(job.partial).items():
+            st.markdown(f"**{section}**")
+            st.text(bullet_points)
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
 
 # Streamlit frontend
 def main():
+    setup_instrumentation()
     st.title("PDF to PowerPoint Generator")
 
     # Step 1: Input for presentation name (to replace title on first slide)
@@ -63,66 +173,43 @@ def main():
         if not os.path.exists(UPLOAD_DIR):
             os.makedirs(UPLOAD_DIR)
 
-        # Save the uploaded PDF
-        pdf_path = os.path.join(UPLOAD_DIR, uploaded_pdf.name)
-        with open(pdf_path, "wb") as f:
-            f.write(uploaded_pdf.getbuffer())
+        # Save the uploaded PDF (once per distinct file, not on every rerun)
+        file_hash = hashlib.sha256(uploaded_pdf.getbuffer()).hexdigest()
+        pdf_path = os.path.join(UPLOAD_DIR, f"{file_hash[:16]}_{uploaded_pdf.name}")
+        if not os.path.exists(pdf_path):
+            with open(pdf_path, "wb") as f:
+                f.write(uploaded_pdf.getbuffer())
 
-        # Convert PDF pages to images and display them
-        st.write("Displaying the uploaded PDF as images...")
-        pdf_images = display_pdf_as_images(pdf_path)
+        # Open the PDF for the preview; pages are only rendered when shown. The job opens its own
+        # document in its worker thread, since a ParsedDocument must not be used by two threads at once
+        document = ParsedDocument(pdf_path)
 
-        # Generate the presentation only when the button is pressed
+        # Preview the PDF as small thumbnails, a few pages at a time
+        st.write("Preview of the uploaded PDF:")
+        display_pdf_preview(document, file_hash)
+
+        # Queue the generation only when the button is pressed
         if generate_presentation:
             st.write("Starting presentation generation process...")
-
-            # Step 1: Extract sections and images from the PDF
-            st.write("Extracting sections and images from the PDF...")
-            content_dict = extract_sections_and_images(pdf_path)
-            st.write("Extraction complete.")
-            st.write(content_dict)  # Display the extracted content
-
-            # Step 2: Summarize the sections
-            st.write("Summarizing sections...")
-            summarized_dict = summarize_sections(content_dict)
-            st.write("Summarization complete.")
-
-            # Step 3: Generate bullet points for sections
-            st.write("Generating bullet points...")
-            bullet_point_dict = send_to_mistral_for_bullet_points(summarized_dict)
-            st.write("Bullet point generation complete.")
-
-            # Step 4: Prepare images dictionary
-            st.write("Preparing image data...")
-            images_dict = {section: content.get("images", []) for section, content in content_dict.items()}
-
-            # Step 5: Load the chosen PowerPoint template
-            ppt_template_path = os.path.join(TEMPLATE_DIR, template_choice)
-            prs = Presentation(ppt_template_path)
-
-            # Step 6: Update the title on the first slide with the presentation name
-            if presentation_name:
-                st.write(f"Updating title on the first slide to: {presentation_name}")
-                update_presentation_title(prs, presentation_name)
-
-            # Step 7: Generate the presentation
-            st.write("Generating the PowerPoint presentation...")
-            create_presentation(prs, bullet_point_dict, images_dict, font_choice)
-            st.write("Presentation generation complete.")
-
-            # Save the generated presentation
-            output_ppt_path = f"{presentation_name}.pptx"
-            prs.save(output_ppt_path)
-
-            # Button to download the generated presentation
-            st.write("Your presentation is ready for download.")
-            with open(output_ppt_path, "rb") as f:
-                st.download_button(
-                    label="Download Presentation",
-                    data=f,
-                    file_name=output_ppt_path,
-                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation"
-                )
+            job_key = json.dumps([file_hash, template_choice, font_choice, presentation_name, PIPELINE_SETTINGS],
+                                 sort_keys=True)
+            job = get_job_manager().submit(
+                job_key, run_generation_job,
+                pdf_path=pdf_path,
+                template_path=os.path.join(TEMPLATE_DIR, template_choice),
+                selected_font=font_choice,
+                presentation_name=presentation_name,
+                llm_cache=get_llm_cache(),
+            )
+            st.session_state["job_id"] = job.job_id
+
+        document.close()
+
+    # Poll the job started from this session, if any
+    job_id = st.session_state.get("job_id")
+    job = get_job_manager().get(job_id) if job_id else None
+    if job is not None:
+        display_job_status(job)
 
 if __name__ == "__main__":
     main()
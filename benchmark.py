@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pptx import Presentation
+from extract_sections import extract_sections_and_images
+from summarize_sections import summarize_sections, send_to_mistral_for_bullet_points, BULLET_POINT_CONCURRENCY, \
+    BULLET_POINT_BATCH_TOKENS
+from mistral_summarizer import MistralClient
+from pptx_exp import create_presentation
+from slide_images import ImagePreparer
+from fake_ollama import FakeOllamaServer
+from instrumentation import configure_instrumentation
+
+def run_benchmark(pdf_path, template_path=None, summarizer="tfidf", llm_concurrency=BULLET_POINT_CONCURRENCY,
+                  batch_tokens=BULLET_POINT_BATCH_TOKENS, llm_url=None, server_options=None, work_dir=None):
+    """
+    Run extract_sections_and_images -> summarize_sections -> send_to_mistral_for_bullet_points ->
+    create_presentation once and return the wall time of every stage, in seconds.
+    Bullet points come from a FakeOllamaServer unless llm_url points at a real server.
+    No caches are used, so every run does the full work.
+    :param template_path: PowerPoint template; defaults to python-pptx's blank presentation.
+    :param server_options: FakeOllamaServer arguments (token_latency, slots, failure_rate, ...).
+    :param work_dir: Directory for extracted images and the deck; a temporary directory by default.
+    """
+    own_work_dir = work_dir is None
+    if own_work_dir:
+        work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    server = None
+    if llm_url is None:
+        server = FakeOllamaServer(**(server_options or {})).start()
+        llm_url = server.url
+    client = MistralClient(url=llm_url)
+
+    timings = {}
+    try:
+        start = time.perf_counter()
+        content_dict = extract_sections_and_images(pdf_path, image_output_dir=os.path.join(work_dir, "images"))
+        timings["extract"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        summarized_dict = summarize_sections(content_dict, backend=summarizer)
+        timings["summarize"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        bullet_point_dict = send_to_mistral_for_bullet_points(
+            summarized_dict, max_workers=llm_concurrency, batch_tokens=batch_tokens, client=client)
+        timings["bullet_points"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        prs = Presentation(template_path) if template_path else Presentation()
+        images_dict = {section: content.get("images", []) for section, content in content_dict.items()}
+        create_presentation(prs, bullet_point_dict, images_dict, "Calibri",
+                            ImagePreparer(os.path.join(work_dir, "image_cache")))
+        prs.save(os.path.join(work_dir, "benchmark.pptx"))
+        timings["presentation"] = time.perf_counter() - start
+    finally:
+        client.close()
+        if server is not None:
+            server.stop()
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    timings["total"] = sum(timings.values())
+    return {
+        "timings": timings,
+        "sections": len(content_dict),
+        "llm_calls": client.calls,
+        "llm_failures": client.failures,
+        "llm_mean_latency": client.total_latency / client.calls if client.calls else 0.0,
+    }
+
+def print_report(runs):
+    stages = list(runs[0]["timings"])
+    print(f"{'stage':<15}" + "".join(f"{'run ' + str(i + 1):>10}" for i in range(len(runs))) + f"{'best':>10}")
+    for stage in stages:
+        values = [run["timings"][stage] for run in runs]
+        print(f"{stage:<15}" + "".join(f"{value:>10.3f}" for value in values) + f"{min(values):>10.3f}")
+    last = runs[-1]
+    print(f"{last['sections']} sections, {last['llm_calls']} LLM calls ({last['llm_failures']} failed), "
+          f"mean LLM latency {last['llm_mean_latency']:.3f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark against a fake Ollama server.")
+    parser.add_argument("pdf", help="PDF file to convert.")
+    parser.add_argument("--template", default=None, help="PowerPoint template (default: blank presentation).")
+    parser.add_argument("--summarizer", default="tfidf", help="Summarizer backend: spacy or tfidf.")
+    parser.add_argument("--llm-concurrency", type=int, default=BULLET_POINT_CONCURRENCY)
+    parser.add_argument("--batch-tokens", type=int, default=BULLET_POINT_BATCH_TOKENS, help="0 disables batching.")
+    parser.add_argument("--llm-url", default=None, help="Use this generate endpoint instead of the fake server.")
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0005)
+    parser.add_argument("--slots", type=int, default=4)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Write the runs as JSON to this file.")
+    parser.add_argument("--spans", default=None, help="Append every span as a JSON line to this file.")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    configure_instrumentation(args.log_level, spans_path=args.spans)
+
+    server_options = {
+        "token_latency": args.token_latency,
+        "prompt_token_latency": args.prompt_token_latency,
+        "slots": args.slots,
+        "failure_rate": args.failure_rate,
+        "disconnect_rate": args.disconnect_rate,
+        "seed": 0,
+    }
+    runs = [run_benchmark(args.pdf, args.template, args.summarizer, args.llm_concurrency, args.batch_tokens,
+                          args.llm_url, server_options) for _ in range(args.repeat)]
+    print_report(runs)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "runs": runs}, f, indent=2)
@@ -1,80 +1,345 @@
 import pdfplumber
 import re
 import os
+import io
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from pdfminer.pdftypes import resolve1, LITERALS_DCT_DECODE, LITERALS_JPX_DECODE, LITERALS_FLATE_DECODE
+from pdfminer.pdfcolor import LITERAL_DEVICE_RGB, LITERAL_DEVICE_GRAY
+from pdfminer.psparser import LIT
+from pdf_document import ParsedDocument, shard_page_numbers, page_xobjects, pool_context
+from section_store import Section, SectionStore
+from instrumentation import span
 
-def extract_sections_and_images(filename, image_output_dir="extracted_images"):
+logger = logging.getLogger(__name__)
+
+LITERAL_ICC_BASED = LIT('ICCBased')
+IMAGE_RESOLUTION = 300  # DPI used when an image has to be rendered from the page
+
+def extract_sections_and_images(filename, image_output_dir="extracted_images", document=None, workers=None,
+                                cache=None):
     """
     Extract text and images from the PDF, identify sections based on font size.
     Save sections and their content (text + high-quality images) in a dictionary.
+    The dictionary is a read-only view over a SectionStore (available as `.store`).
+    :param filename: Path to the PDF file.
+    :param image_output_dir: Directory where extracted images are written.
+    :param document: Optional ParsedDocument already opened for `filename` (e.g. by the pipeline),
+                     so the PDF is not opened and parsed a second time.
+    :param workers: Number of worker processes. With more than one worker, pages are sharded
+                    across a process pool and the per-page results are merged in page order.
+                    Defaults to the document's workers when `document` is given.
+    :param cache: Optional PageCache. Only pages whose content changed since they were cached
+                  are re-extracted; section assembly is then replayed over all pages.
+                  Ignored when `document` is given (the document's own cache is used).
     """
-    content_dict = {}  # Dictionary to store sections and their content
-    current_section = "Introduction"  # Default section
-    font_threshold = None  # Threshold for detecting section headings
-    section_buffer = []  # Buffer to collect words for section titles
-
     # Ensure the output directory for images exists
     if not os.path.exists(image_output_dir):
         os.makedirs(image_output_dir)
 
+    owns_document = document is None
+    if owns_document:
+        document = ParsedDocument(filename, workers=workers, cache=cache)
+    elif workers is None:
+        workers = document.workers
+
+    try:
+        pages = document.pages
+        cache = document.cache
+
+        # Reuse the images of unchanged pages
+        page_images = {}
+        pending_pages = []
+        for parsed_page in pages:
+            if cache is not None:
+                key = document.page_keys[parsed_page.page_num]
+                image_files = cache.load_images(key, parsed_page.page_num, image_output_dir)
+                if image_files is not None:
+                    page_images[parsed_page.page_num] = image_files
+                    continue
+            pending_pages.append(parsed_page)
+
+        with span("image_extract", pages=len(pending_pages), cached_pages=len(page_images)) as image_span:
+            if workers and workers > 1 and len(pending_pages) > 1:
+                extracted_images = extract_images_parallel(document.filename, pending_pages, image_output_dir, workers)
+            else:
+                extracted_images = {}
+                for parsed_page in pending_pages:
+                    page = document.page(parsed_page.page_num)
+                    extracted_images[parsed_page.page_num] = extract_page_images(
+                        page, parsed_page.page_num, parsed_page.images, image_output_dir, parsed_page.image_names,
+                        render_page=lambda page_num=parsed_page.page_num: document.render_page(page_num, IMAGE_RESOLUTION))
+            image_span.set(images=sum(len(image_files) for image_files in extracted_images.values()))
+
+        for parsed_page in pending_pages:
+            image_files = extracted_images.get(parsed_page.page_num, [])
+            page_images[parsed_page.page_num] = image_files
+            if cache is not None:
+                cache.store_images(document.page_keys[parsed_page.page_num], image_files)
+    finally:
+        if owns_document:
+            document.close()
+
+    with span("section_assemble", pages=len(pages)) as assemble_span:
+        section_store = assemble_sections(pages, page_images)
+        assemble_span.set(sections=len(section_store))
+
+    logger.info("Finished extracting sections and images.")
+    return section_store.as_content_dict()
+
+def extract_page_images(page, page_num, image_bboxes, image_output_dir, image_names=None, render_page=None):
+    """
+    Save the high-quality images of a single page and return their file paths.
+    Images are written straight from their embedded stream when possible; vector graphics,
+    masked images and unsupported encodings are cropped from a single raster of the page,
+    so the page is rendered at most once however many figures it has.
+    :param page: pdfplumber Page object.
+    :param page_num: Zero-based page index.
+    :param image_bboxes: List of (x0, top, x1, bottom) image bounding boxes on the page.
+    :param image_output_dir: Directory where extracted images are written.
+    :param image_names: XObject name of each image (None where unknown), see ParsedPage.
+    :param render_page: Optional callable returning the page raster at IMAGE_RESOLUTION,
+                        e.g. ParsedDocument.render_page so the preview can share it.
+    """
+    image_names = image_names or [None] * len(image_bboxes)
+    xobjects = page_xobjects(page) if any(image_names) else {}
+    if render_page is None:
+        render_page = lambda: page.to_image(resolution=IMAGE_RESOLUTION).original
+    page_raster = None
+
+    image_files = []
+    for img_index, image_bbox in enumerate(image_bboxes):
+        image_path_base = f"{image_output_dir}/page_{page_num+1}_image_{img_index+1}"
+
+        image_filename = None
+        name = image_names[img_index]
+        if name is not None and name in xobjects:
+            image_filename = export_embedded_image(resolve1(xobjects[name]), image_path_base)
+
+        if image_filename is None:
+            if page_raster is None:
+                page_raster = render_page()
+            page_image = crop_bbox(page_raster, page.bbox, image_bbox, IMAGE_RESOLUTION)
+
+            # Save the image to a file with higher quality
+            image_filename = f"{image_path_base}.png"
+            page_image.save(image_filename, format="PNG", optimize=True, quality=95)
+        image_files.append(image_filename)
+
+    return image_files
+
+def crop_bbox(page_raster, page_bbox, bbox, resolution):
+    """
+    Crop a PDF-space bounding box out of a raster of the whole page.
+    :param page_raster: PIL image of the page rendered at `resolution` DPI.
+    :param page_bbox: (x0, top, x1, bottom) of the page itself, as in pdfplumber's page.bbox.
+    :param bbox: (x0, top, x1, bottom) of the region to crop, in PDF points.
+    """
+    scale = resolution / 72
+    left = max(0, int((bbox[0] - page_bbox[0]) * scale))
+    top = max(0, int((bbox[1] - page_bbox[1]) * scale))
+    right = min(page_raster.width, int(round((bbox[2] - page_bbox[0]) * scale)))
+    bottom = min(page_raster.height, int(round((bbox[3] - page_bbox[1]) * scale)))
+    return page_raster.crop((left, top, max(right, left + 1), max(bottom, top + 1)))
+
+def _image_mode(stream):
+    """
+    PIL mode matching the image's colour space, or None if it is not plain RGB/grayscale.
+    """
+    colorspace = resolve1(stream.attrs.get('ColorSpace'))
+    if isinstance(colorspace, list) and colorspace and colorspace[0] == LITERAL_ICC_BASED:
+        components = resolve1(resolve1(colorspace[1]).attrs.get('N'))
+        return {1: 'L', 3: 'RGB'}.get(components)
+    if colorspace == LITERAL_DEVICE_RGB:
+        return 'RGB'
+    if colorspace == LITERAL_DEVICE_GRAY:
+        return 'L'
+    return None
+
+def export_embedded_image(stream, image_path_base):
+    """
+    Write an image XObject from its embedded stream without rendering the page.
+    JPEG data is passed through unchanged as .jpg; JPEG 2000 (which PowerPoint cannot
+    embed) and 8-bit Flate-encoded pixels are stored as PNG.
+    Returns the written file path, or None if the image must be rasterized instead.
+    :param stream: pdfminer PDFStream of the image XObject.
+    :param image_path_base: Output path without extension.
+    """
+    attrs = stream.attrs
+    if resolve1(attrs.get('ImageMask')) or 'SMask' in attrs or 'Mask' in attrs or 'Decode' in attrs:
+        return None  # Masked or remapped images only look right when rendered
+
+    filters = [f for f, _ in stream.get_filters()]
+    mode = _image_mode(stream)
+    try:
+        if filters and filters[-1] in LITERALS_DCT_DECODE:
+            if mode is None:
+                return None  # e.g. CMYK JPEGs, which many viewers show inverted
+            image_filename = f"{image_path_base}.jpg"
+            with open(image_filename, "wb") as f:
+                f.write(stream.get_data())
+            return image_filename
+
+        if filters and filters[-1] in LITERALS_JPX_DECODE:
+            image = Image.open(io.BytesIO(stream.get_data()))
+        elif mode is not None and resolve1(attrs.get('BitsPerComponent')) == 8 \
+                and all(f in LITERALS_FLATE_DECODE for f in filters):
+            size = (resolve1(attrs.get('Width')), resolve1(attrs.get('Height')))
+            image = Image.frombytes(mode, size, stream.get_data())
+        else:
+            return None
+
+        image_filename = f"{image_path_base}.png"
+        image.save(image_filename, format="PNG", optimize=True)
+        return image_filename
+    except Exception as e:
+        logger.warning("Could not export embedded image %s, rendering it instead: %s", image_path_base, e)
+        return None
+
+def _extract_images_shard(filename, shard, image_output_dir):
+    """
+    Worker entry point: open the PDF and save the images of a shard of pages.
+    :param shard: List of (page_num, image_bboxes, image_names) tuples.
+    """
     with pdfplumber.open(filename) as pdf:
-        for page_num, page in enumerate(pdf.pages):
-            print(f"Processing page {page_num + 1}...")
+        return {page_num: extract_page_images(pdf.pages[page_num], page_num, image_bboxes, image_output_dir,
+                                              image_names)
+                for page_num, image_bboxes, image_names in shard}
 
-            # Extract text and font size
-            words = page.extract_words(extra_attrs=['fontname', 'size'])
+def extract_images_parallel(filename, pages, image_output_dir, workers):
+    """
+    Shard image extraction across a process pool. Returns {page_num: [image paths]}.
+    """
+    page_shards = shard_page_numbers(len(pages), workers)
+    shards = [[(pages[i].page_num, pages[i].images, pages[i].image_names) for i in shard] for shard in page_shards]
+    shards = [shard for shard in shards if any(image_bboxes for _, image_bboxes, _ in shard)]
 
-            for word in words:
-                text = word['text']
-                font_size = word['size']
+    page_images = {}
+    if not shards:
+        return page_images
 
-                # Set a threshold for identifying section headers based on font size
-                if font_threshold is None:
-                    font_threshold = determine_font_threshold(words)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as executor:
+        for shard_images in executor.map(_extract_images_shard, [filename] * len(shards), shards,
+                                         [image_output_dir] * len(shards)):
+            page_images.update(shard_images)
+    return page_images
 
-                # Collect words for section titles based on large font size
-                if font_size >= font_threshold:
-                    section_buffer.append(clean_extracted_text(text))
+def collect_word_columns(pages):
+    """
+    Flatten the words of all pages into columnar NumPy arrays, so heading detection
+    works on whole arrays instead of one word dictionary at a time.
+    Returns (texts, columns): the list of word strings and a dictionary of arrays
+    'size' (from each page's font_sizes) and 'page'.
+    """
+    texts = [word['text'] for parsed_page in pages for word in parsed_page.words]
+    columns = {
+        "size": np.concatenate([parsed_page.font_sizes for parsed_page in pages]) if pages else np.zeros(0),
+        "page": np.repeat([parsed_page.page_num for parsed_page in pages],
+                          [len(parsed_page.words) for parsed_page in pages]).astype(np.intp),
+    }
+    return texts, columns
 
-                else:
-                    # If there are collected section words, join them into a title
-                    if section_buffer:
-                        current_section = ' '.join(section_buffer).strip()
-                        section_buffer = []  # Clear the buffer
-                        content_dict[current_section] = {"text": "", "images": []}  # Create a new section
+def detect_headings(font_sizes, font_threshold):
+    """
+    Group consecutive large-font words into heading runs.
+    Returns (is_heading, run_starts, run_ends): a boolean mask over the words, and the
+    start and end (exclusive) word index of each heading run.
+    """
+    is_heading = font_sizes >= font_threshold
+    previous = np.concatenate(([False], is_heading[:-1]))
+    following = np.concatenate((is_heading[1:], [False]))
+    run_starts = np.flatnonzero(is_heading & ~previous)
+    run_ends = np.flatnonzero(is_heading & ~following) + 1
+    return is_heading, run_starts, run_ends
+
+def assemble_sections(pages, page_images):
+    """
+    Merge per-page words and images into a SectionStore, in page order.
+    The heading threshold comes from a histogram of font sizes over the whole document,
+    and runs of consecutive heading words (also across page boundaries) become section titles.
+    :param pages: List of ParsedPage objects in page order.
+    :param page_images: Dictionary of page number to list of image paths.
+    """
+    texts, columns = collect_word_columns(pages)
+    font_sizes = columns["size"]
+    font_threshold = font_threshold_from_sizes(font_sizes)
+    if font_threshold is None:
+        font_threshold = np.inf  # No words, so no headings
+
+    is_heading, run_starts, run_ends = detect_headings(font_sizes, font_threshold)
+
+    # Section 0 is the default "Introduction"; section k starts after heading run k.
+    # Each body word belongs to the section of the last heading run before it.
+    run_marks = np.zeros(len(texts), dtype=np.intp)
+    run_marks[run_starts] = 1
+    run_ids = np.cumsum(run_marks)
+    body_positions = np.flatnonzero(~is_heading)
+
+    # Images are added to the section that is current at the end of their page, i.e. the
+    # section of the last body word so far (a heading still being read does not count).
+    page_ends = np.cumsum([len(parsed_page.words) for parsed_page in pages])
+    last_body = np.searchsorted(body_positions, page_ends, side='left') - 1
+    page_sections = np.where(last_body >= 0, run_ids[body_positions[np.maximum(last_body, 0)]], 0) \
+        if len(body_positions) else np.zeros(len(pages), dtype=np.intp)
 
-                    # Append the text to the current section
-                    if current_section not in content_dict:
-                        content_dict[current_section] = {"text": "", "images": []}
-                    content_dict[current_section]["text"] += f"{text} "
+    section_images = {}
+    section_image_pages = {}
+    for parsed_page, section_id in zip(pages, page_sections):
+        image_files = page_images.get(parsed_page.page_num, [])
+        if image_files:
+            section_images.setdefault(int(section_id), []).extend(image_files)
+            section_image_pages.setdefault(int(section_id), []).append(parsed_page.page_num)
 
-            # Extract high-quality images from the current page
-            page_images = page.images
-            for img_index, img in enumerate(page_images):
-                image_bbox = (img['x0'], img['top'], img['x1'], img['bottom'])
-                page_image = page.within_bbox(image_bbox).to_image(resolution=300)
+    # Word ranges of each section's body text
+    body_starts = np.concatenate(([0], run_ends)).astype(np.intp)
+    body_ends = np.concatenate((run_starts, [len(texts)])).astype(np.intp)
 
-                # Save the image to a file with higher quality
-                image_filename = f"{image_output_dir}/page_{page_num+1}_image_{img_index+1}.png"
-                page_image.save(image_filename, format="PNG", optimize=True, quality=95)
+    # All words go into one buffer, each followed by a space; sections keep character offsets into it
+    text_buffer = ''.join(f"{text} " for text in texts)
+    offsets = np.concatenate(([0], np.cumsum(np.fromiter((len(text) + 1 for text in texts), dtype=np.intp,
+                                                         count=len(texts)))))
+    word_pages = columns["page"]
 
-                # Add image to the current section
-                content_dict[current_section]["images"].append(image_filename)
+    sections = []
+    for section_id, (start, end) in enumerate(zip(body_starts, body_ends)):
+        images = section_images.get(section_id, [])
+        if start >= end and not images:
+            continue  # A heading with no text after it never becomes a section
 
-            print(f"Images for section '{current_section}': {content_dict[current_section]['images']}")
+        if section_id == 0:
+            title = "Introduction"
+        else:
+            title_words = texts[run_starts[section_id - 1]:run_ends[section_id - 1]]
+            title = ' '.join(clean_extracted_text(text) for text in title_words).strip()
 
-    print("Finished extracting sections and images.")
-    return content_dict
+        section_pages = section_image_pages.get(section_id, [])
+        if start < end:
+            section_pages = section_pages + [int(word_pages[start]), int(word_pages[end - 1])]
+        sections.append(Section(title, int(offsets[start]), int(offsets[end]),
+                                min(section_pages), max(section_pages), images))
+
+    logger.info("Detected %d sections (heading font size >= %.1f).", len(sections), font_threshold)
+    return SectionStore(text_buffer, sections)
+
+def font_threshold_from_sizes(font_sizes, ratio=1.5):
+    """
+    Heading threshold from a histogram of font sizes: the most common (body text) size,
+    rounded to half a point, times `ratio`. Returns None if there are no sizes.
+    """
+    if len(font_sizes) == 0:
+        return None
+    sizes, counts = np.unique(np.round(np.asarray(font_sizes, dtype=float) * 2) / 2, return_counts=True)
+    return float(sizes[np.argmax(counts)]) * ratio
 
 # Add error handling for determining font threshold
 def determine_font_threshold(words):
     try:
-        font_sizes = [word['size'] for word in words]
-        average_size = sum(font_sizes) / len(font_sizes)
-        return average_size * 1.5
+        return font_threshold_from_sizes(np.fromiter((word['size'] for word in words), dtype=float))
     except Exception as e:
-        print(f"Error determining font threshold: {e}")
+        logger.error("Error determining font threshold: %s", e)
         return None
 
 def clean_extracted_text(text):
     return re.sub(r'\s+', ' ', text).strip()
-
@@ -0,0 +1,200 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN = re.compile(r'\S+\s*')
+
+def fake_bullet_points(content):
+    """
+    Deterministic stand-in for Mistral's answer to the bullet point prompt: a topic line
+    and up to five bullets made of the content's first sentences.
+    """
+    sentences = [sentence.strip() for sentence in re.split(r'(?<=[.!?])\s+', content) if sentence.strip()]
+    topic = " ".join(content.split()[:4]) or "Empty section"
+    bullets = [" ".join(sentence.split()[:12]) for sentence in sentences[:5]] or ["No content"]
+    return topic, bullets
+
+def fake_response(request):
+    """
+    Response text for a generate request, following the two prompt shapes mistral_summarizer sends:
+    a single paragraph ("Content:") or a JSON object of paragraphs ("Paragraphs:") with format=json.
+    """
+    prompt = request.get("prompt", "")
+    if request.get("format") == "json" and "Paragraphs:\n" in prompt:
+        try:
+            paragraphs = json.loads(prompt.split("Paragraphs:\n", 1)[1])
+        except json.JSONDecodeError:
+            return "{}"
+        response = {}
+        for paragraph_id, content in paragraphs.items():
+            topic, bullets = fake_bullet_points(content)
+            response[paragraph_id] = {"topic": topic, "bullets": bullets}
+        return json.dumps(response)
+
+    content = prompt.split("Content:\n", 1)[-1]
+    topic, bullets = fake_bullet_points(content)
+    return "\n".join([f"Topic: {topic}", "Summary:"] + [f"- {bullet}" for bullet in bullets])
+
+class FakeOllamaServer:
+    """
+    Local stand-in for the Ollama /api/generate endpoint, for benchmarks and tests without a GPU.
+    It streams NDJSON in chunked encoding like Ollama, serves at most `slots` generations at once
+    (other requests wait, as with OLLAMA_NUM_PARALLEL), and can inject failures.
+    :param port: Port to listen on; 0 picks a free port (see `url`).
+    :param token_latency: Seconds per generated token.
+    :param prompt_token_latency: Seconds per prompt token (estimated as four characters), before the first token.
+    :param slots: Generations served concurrently.
+    :param failure_rate: Fraction of requests answered with HTTP 503.
+    :param disconnect_rate: Fraction of requests whose connection is dropped halfway through the stream.
+    :param seed: Seed for the failure injection.
+    """
+    def __init__(self, host="127.0.0.1", port=0, token_latency=0.02, prompt_token_latency=0.0, slots=1,
+                 failure_rate=0.0, disconnect_rate=0.0, seed=None):
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.failure_rate = failure_rate
+        self.disconnect_rate = disconnect_rate
+        self.requests = 0
+        self.failures = 0
+        self._slots = threading.BoundedSemaphore(slots)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    pass  # The client closed a keep-alive connection
+
+            def do_POST(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _draw(self, rate):
+        with self._lock:
+            return self._random.random() < rate
+
+    def _handle(self, handler):
+        body = handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+        with self._lock:
+            self.requests += 1
+
+        if handler.path != "/api/generate":
+            self._send_error(handler, 404, "not found")
+            return
+        try:
+            request = json.loads(body)
+        except json.JSONDecodeError:
+            self._send_error(handler, 400, "invalid JSON")
+            return
+        if self._draw(self.failure_rate):
+            with self._lock:
+                self.failures += 1
+            self._send_error(handler, 503, "injected failure")
+            return
+
+        with self._slots:
+            options = request.get("options") or {}
+            tokens = TOKEN.findall(fake_response(request))
+            if options.get("num_predict", -1) >= 0:
+                tokens = tokens[:options["num_predict"]]
+            time.sleep(self.prompt_token_latency * (len(request.get("prompt", "")) // 4 + 1))
+
+            if request.get("stream", True):
+                self._stream(handler, request, tokens)
+            else:
+                time.sleep(self.token_latency * len(tokens))
+                self._send_json(handler, 200, self._done(request, tokens, "".join(tokens)))
+
+    def _done(self, request, tokens, response=""):
+        return {"model": request.get("model"), "response": response, "done": True, "eval_count": len(tokens)}
+
+    def _stream(self, handler, request, tokens):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+
+        disconnect_at = len(tokens) // 2 if self._draw(self.disconnect_rate) else None
+        for i, token in enumerate(tokens):
+            if i == disconnect_at:
+                with self._lock:
+                    self.failures += 1
+                handler.close_connection = True
+                return  # No terminating chunk: the client sees a broken stream
+            time.sleep(self.token_latency)
+            self._write_chunk(handler, {"model": request.get("model"), "response": token, "done": False})
+        self._write_chunk(handler, self._done(request, tokens))
+        handler.wfile.write(b"0\r\n\r\n")
+        handler.wfile.flush()
+
+    def _write_chunk(self, handler, data):
+        line = json.dumps(data).encode() + b"\n"
+        handler.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        handler.wfile.flush()
+
+    def _send_json(self, handler, status, data):
+        body = json.dumps(data).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_error(self, handler, status, message):
+        self._send_json(handler, status, {"error": message})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama generate server speaking the NDJSON streaming protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds per generated token.")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0, help="Seconds per prompt token.")
+    parser.add_argument("--slots", type=int, default=1, help="Generations served concurrently.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 503.")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="Fraction of streams cut off halfway.")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    fake_server = FakeOllamaServer(args.host, args.port, args.token_latency, args.prompt_token_latency, args.slots,
+                                   args.failure_rate, args.disconnect_rate, args.seed)
+    print(f"Fake Ollama server listening on {fake_server.url}")
+    try:
+        fake_server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake_server.stop()
@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; spans are recorded without peak RSS there
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+METRIC_PREFIX = "slidegen"
+
+_sinks = []
+_sinks_lock = threading.Lock()
+_local = threading.local()
+
+def peak_rss_bytes():
+    """
+    Highest resident set size of this process so far, or None where it cannot be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes
+
+def current_rss_bytes():
+    """
+    Current resident set size of this process, or None where it cannot be measured (outside Linux).
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class Span:
+    """
+    One timed stage or sub-step. `counts` holds item counts (pages, sentences, tokens, ...)
+    that the instrumented code adds while the span is open.
+    `cpu_time` is the CPU time of the thread that ran the span, so concurrent jobs are not charged
+    for each other; work the span hands to other threads or processes shows up in their own spans.
+    `rss` is the process's resident set size at the end of the span and `rss_delta` its change
+    over the span; other threads allocate too, so the delta of a short span is only indicative.
+    """
+    __slots__ = ("name", "parent", "counts", "start_time", "wall_time", "cpu_time", "rss", "rss_delta", "error",
+                 "_start_wall", "_start_cpu", "_start_rss")
+
+    def __init__(self, name, parent, counts):
+        self.name = name
+        self.parent = parent
+        self.counts = dict(counts)
+        self.start_time = time.time()
+        self.wall_time = None
+        self.cpu_time = None
+        self.rss = None
+        self.rss_delta = None
+        self.error = None
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.thread_time()
+        self._start_rss = current_rss_bytes()
+
+    def count(self, key, n=1):
+        self.counts[key] = self.counts.get(key, 0) + n
+
+    def set(self, **counts):
+        self.counts.update(counts)
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self._start_wall
+        self.cpu_time = time.thread_time() - self._start_cpu
+        self.rss = current_rss_bytes()
+        if self.rss is not None and self._start_rss is not None:
+            self.rss_delta = self.rss - self._start_rss
+
+    def as_dict(self):
+        return {
+            "span": self.name,
+            "parent": self.parent,
+            "start": self.start_time,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "rss": self.rss,
+            "rss_delta": self.rss_delta,
+            "counts": self.counts,
+            "error": self.error,
+        }
+
+@contextmanager
+def span(name, **counts):
+    """
+    Time the enclosed block as a span and hand it to every registered sink when it ends.
+    Spans opened inside another span on the same thread record it as their parent.
+        with span("summarize", sections=len(content_dict)) as s:
+            ...
+            s.count("chunks", len(chunks))
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    current = Span(name, stack[-1].name if stack else None, counts)
+    stack.append(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        current.finish()
+        logger.debug("%s took %.3fs (cpu %.3fs) %s", name, current.wall_time, current.cpu_time, current.counts)
+        with _sinks_lock:
+            sinks = list(_sinks)
+        for sink in sinks:
+            try:
+                sink.record(current)
+            except Exception:
+                logger.exception("Span sink %r failed", sink)
+
+def add_sink(sink):
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+class JsonLinesSink:
+    """
+    Appends every span as one JSON object per line.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def record(self, span):
+        line = json.dumps(span.as_dict()) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+class MetricsRegistry:
+    """
+    Aggregates spans into Prometheus metrics: per span name, how often it ran, its total wall
+    and CPU seconds and the summed item counts, plus the process's current and peak RSS.
+    """
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def record(self, span):
+        with self._lock:
+            totals = self._spans.setdefault(span.name, {"count": 0, "errors": 0, "wall": 0.0, "cpu": 0.0, "items": {}})
+            totals["count"] += 1
+            totals["errors"] += span.error is not None
+            totals["wall"] += span.wall_time
+            totals["cpu"] += span.cpu_time
+            for key, value in span.counts.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals["items"][key] = totals["items"].get(key, 0) + value
+
+    def render(self):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        p = self.prefix
+        lines = [
+            f"# TYPE {p}_span_total counter",
+            f"# TYPE {p}_span_errors_total counter",
+            f"# TYPE {p}_span_wall_seconds_total counter",
+            f"# TYPE {p}_span_cpu_seconds_total counter",
+            f"# TYPE {p}_span_items_total counter",
+        ]
+        with self._lock:
+            for name, totals in sorted(self._spans.items()):
+                label = f'span="{name}"'
+                lines.append(f"{p}_span_total{{{label}}} {totals['count']}")
+                lines.append(f"{p}_span_errors_total{{{label}}} {totals['errors']}")
+                lines.append(f"{p}_span_wall_seconds_total{{{label}}} {totals['wall']:.6f}")
+                lines.append(f"{p}_span_cpu_seconds_total{{{label}}} {totals['cpu']:.6f}")
+                for key, value in sorted(totals["items"].items()):
+                    lines.append(f'{p}_span_items_total{{{label},item="{key}"}} {value}')
+        # Process-wide gauges, sampled when scraped
+        rss, peak_rss = current_rss_bytes(), peak_rss_bytes()
+        if rss is not None:
+            lines.append(f"# TYPE {p}_rss_bytes gauge")
+            lines.append(f"{p}_rss_bytes {rss}")
+        if peak_rss is not None:
+            lines.append(f"# TYPE {p}_peak_rss_bytes gauge")
+            lines.append(f"{p}_peak_rss_bytes {peak_rss}")
+        return "\n".join(lines) + "\n"
+
+def start_metrics_server(registry, host="127.0.0.1", port=9464):
+    """
+    Serve registry.render() at http://host:port/metrics from a background thread.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Serving metrics at http://%s:%d/metrics", host, httpd.server_address[1])
+    return httpd
+
+def configure_instrumentation(log_level="INFO", spans_path=None, metrics_port=None):
+    """
+    Set up logging and span output for an application entry point.
+    :param log_level: Level of the root logger ("DEBUG" also logs every span).
+    :param spans_path: Append spans as JSON lines to this file.
+    :param metrics_port: Serve Prometheus metrics on this port.
+    Returns the MetricsRegistry when a metrics port is given, else None.
+    """
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    if spans_path:
+        add_sink(JsonLinesSink(spans_path))
+    registry = None
+    if metrics_port is not None:
+        registry = add_sink(MetricsRegistry())
+        start_metrics_server(registry, port=metrics_port)
+    return registry
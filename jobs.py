@@ -0,0 +1,102 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class Job:
+    """
+    One background generation job. The worker updates `stage`, `progress` and `partial`
+    (intermediate results, such as bullet points still being generated); the UI polls
+    them until `status` is "done" or "failed".
+    """
+    def __init__(self, job_id, key, work_dir):
+        self.job_id = job_id
+        self.key = key  # Identical requests share a key, and therefore a job
+        self.work_dir = work_dir  # Private directory for this job's files
+        self.status = "queued"  # queued, running, done or failed
+        self.stage = "Waiting for a free worker..."
+        self.progress = 0.0
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def update(self, stage, progress):
+        self.stage = stage
+        self.progress = progress
+
+    def update_partial(self, key, value):
+        self.partial[key] = value
+
+class JobManager:
+    """
+    Runs jobs on a bounded thread pool. Submitting a request whose key matches a queued,
+    running or successfully finished job returns that job instead of starting another.
+    Finished jobs (and their working directories) are forgotten after `job_ttl` seconds.
+    """
+    def __init__(self, max_workers=2, jobs_dir="jobs", job_ttl=3600):
+        self.jobs_dir = jobs_dir
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+        self._jobs = {}
+        self._jobs_by_key = {}
+        self._lock = threading.Lock()
+        if not os.path.exists(jobs_dir):
+            os.makedirs(jobs_dir)
+
+    def submit(self, key, fn, **kwargs):
+        """
+        Queue fn(work_dir=..., progress=..., partial=..., **kwargs) as a job and return the Job.
+        `progress(stage, fraction)` updates the job's stage, `partial(key, value)` publishes an
+        intermediate result in job.partial; fn's return value becomes job.result.
+        """
+        with self._lock:
+            self._prune()
+            existing = self._jobs_by_key.get(key)
+            if existing is not None and existing.status != "failed":
+                return existing
+
+            job_id = uuid.uuid4().hex[:12]
+            job = Job(job_id, key, os.path.join(self.jobs_dir, job_id))
+            os.makedirs(job.work_dir)
+            self._jobs[job_id] = job
+            self._jobs_by_key[key] = job
+
+        self._executor.submit(self._run, job, fn, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, kwargs):
+        job.status = "running"
+        job.update("Starting...", 0.0)
+        try:
+            job.result = fn(work_dir=job.work_dir, progress=job.update, partial=job.update_partial, **kwargs)
+            status = "done"
+        except Exception as e:
+            logger.exception("Job %s failed", job.job_id)
+            job.error = str(e)
+            status = "failed"
+        # finished_at first: _prune (from another thread) reads it as soon as the status says finished
+        job.finished_at = time.time()
+        job.status = status
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished_at is not None and now - job.finished_at > self.job_ttl:
+                del self._jobs[job_id]
+                if self._jobs_by_key.get(job.key) is job:
+                    del self._jobs_by_key[job.key]
+                shutil.rmtree(job.work_dir, ignore_errors=True)
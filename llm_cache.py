@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+def response_key(model, prompt_version, prompt, params):
+    """
+    Cache key for one generation request.
+    :param model: Model name the request is sent to.
+    :param prompt_version: Version of the prompt template; bump it when the template changes.
+    :param prompt: Full prompt text (template filled in with the content).
+    :param params: JSON-serializable sampling parameters (temperature, ...).
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([model, prompt_version, prompt, params], sort_keys=True).encode())
+    return digest.hexdigest()
+
+class LLMCache:
+    """
+    SQLite-backed cache of LLM responses. Entries expire after `ttl` seconds, and once
+    there are more than `max_entries` the least recently used ones are deleted.
+    `hits` and `misses` count lookups made through this instance.
+    """
+    def __init__(self, path="llm_cache.sqlite3", ttl=30 * 24 * 3600, max_entries=100000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # One connection shared by all threads; every use goes through self._lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key):
+        """
+        Return the cached response for `key`, or None on a miss or when the entry has expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            with self._connection:
+                self._connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now))
+            self._evict(now)
+
+    def _evict(self, now):
+        self._connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        count = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,192 @@
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from pptx import Presentation
+from pdf_document import ParsedDocument
+from extract_sections import extract_sections_and_images, determine_font_threshold
+from summarize_sections import top_sentences, summarize_sections
+from nlp_model import get_nlp
+from pptx_exp import create_presentation
+from slide_images import ImagePreparer
+from synthetic_pdf import generate_pdf
+
+RESULTS_PATH = "benchmark_results/microbenchmarks.jsonl"  # One JSON record per suite run and scale
+
+# Synthetic document sizes; see synthetic_pdf.generate_pdf for the parameters
+SCALES = {
+    "small": {"pages": 5, "words_per_page": 300, "headings_per_page": 2, "images_per_page": 1},
+    "medium": {"pages": 40, "words_per_page": 450, "headings_per_page": 2, "images_per_page": 1},
+    "large": {"pages": 200, "words_per_page": 500, "headings_per_page": 1, "images_per_page": 2,
+              "image_size": (1200, 800)},
+}
+
+def current_commit():
+    """
+    (commit hash, whether the working tree has uncommitted changes) of the checkout this file is in,
+    or (None, None) outside a git checkout.
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=repo_dir).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=repo_dir).returncode != 0
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def time_call(fn, repeat):
+    """
+    Run fn `repeat` times; returns the timings and fn's last result.
+    """
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}, result
+
+def load_benchmark_nlp():
+    """
+    The summarization model, or a blank English pipeline with a rule-based sentencizer when the
+    model is not installed. Returns (nlp, model name) so results from different models are not compared.
+    """
+    try:
+        nlp = get_nlp()
+        return nlp, nlp.meta.get("name", "unknown")
+    except OSError:
+        import spacy
+        nlp = spacy.blank("en")
+        nlp.add_pipe("sentencizer")
+        return nlp, "blank"
+
+def run_suite(scale, repeat=3, work_dir=None):
+    """
+    Generate the synthetic PDF for `scale` and time each pipeline function on it separately.
+    Returns a result record (see RESULTS_PATH).
+    """
+    params = SCALES[scale]
+    own_work_dir = work_dir is None
+    if own_work_dir:
+        work_dir = tempfile.mkdtemp(prefix="microbenchmarks_")
+    try:
+        pdf_path = generate_pdf(os.path.join(work_dir, f"{scale}.pdf"), **params)
+        results = {}
+
+        def extract():
+            image_dir = tempfile.mkdtemp(dir=work_dir)
+            return extract_sections_and_images(pdf_path, image_output_dir=image_dir)
+        results["extract_sections_and_images"], content_dict = time_call(extract, repeat)
+
+        with ParsedDocument(pdf_path) as document:
+            words = [word for page in document.pages for word in page.words]
+        results["determine_font_threshold"], _ = time_call(lambda: determine_font_threshold(words), repeat)
+
+        nlp, spacy_model = load_benchmark_nlp()
+        longest_text = max((content["text"] for content in content_dict.values()), key=len, default="")
+        results["top_sentences"], _ = time_call(lambda: top_sentences(longest_text, nlp=nlp), repeat)
+        results["summarize_sections[spacy]"], summarized_dict = time_call(
+            lambda: summarize_sections(content_dict, nlp=nlp), repeat)
+        results["summarize_sections[tfidf]"], _ = time_call(
+            lambda: summarize_sections(content_dict, backend="tfidf"), repeat)
+
+        # Bullet points in the shape Mistral returns them, without calling an LLM
+        bullet_point_dict = {section: "Topic: " + section + "\n" + "\n".join(f"- {sentence}" for sentence in
+                                                                            summary.split(". ") if sentence)
+                             for section, summary in summarized_dict.items()}
+        images_dict = {section: content["images"] for section, content in content_dict.items()}
+
+        def build():
+            prs = Presentation()
+            # A fresh image cache per run, so every run resizes and recompresses the images
+            create_presentation(prs, bullet_point_dict, images_dict, "Calibri", ImagePreparer(tempfile.mkdtemp(dir=work_dir)))
+            return prs
+        results["create_presentation"], prs = time_call(build, repeat)
+        results["presentation_save"], _ = time_call(lambda: prs.save(io.BytesIO()), repeat)
+    finally:
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit, dirty = current_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "scale": scale,
+        "params": params,
+        "spacy_model": spacy_model,
+        "sections": len(content_dict),
+        "results": results,
+    }
+
+def save_record(record, path=RESULTS_PATH):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+def load_records(path=RESULTS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def find_baseline(records, record, commit=None):
+    """
+    The latest earlier record for the same scale, machine and spaCy model: from `commit` if given,
+    otherwise from any other commit.
+    """
+    for candidate in reversed(records):
+        if candidate is record or candidate["scale"] != record["scale"] \
+                or candidate.get("machine") != record.get("machine") or candidate["spacy_model"] != record["spacy_model"]:
+            continue
+        if commit is not None and not (candidate["commit"] or "").startswith(commit):
+            continue
+        if commit is None and candidate["commit"] == record["commit"]:
+            continue
+        return candidate
+    return None
+
+def print_record(record, baseline=None):
+    commit = (record["commit"] or "unknown")[:10] + ("+dirty" if record["dirty"] else "")
+    print(f"\n{record['scale']} ({record['sections']} sections, spaCy model: {record['spacy_model']}) at {commit}")
+    header = f"{'benchmark':<30}{'median':>10}{'min':>10}"
+    if baseline is not None:
+        header += f"{'baseline':>10}{'change':>9}   (baseline {(baseline['commit'] or 'unknown')[:10]})"
+    print(header)
+    for name, timing in record["results"].items():
+        line = f"{name:<30}{timing['median']:>10.4f}{timing['min']:>10.4f}"
+        if baseline is not None and name in baseline["results"]:
+            baseline_median = baseline["results"][name]["median"]
+            change = (timing["median"] - baseline_median) / baseline_median * 100 if baseline_median else 0.0
+            line += f"{baseline_median:>10.4f}{change:>+8.1f}%"
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each pipeline function on synthetic PDFs and keep the results per commit.")
+    parser.add_argument("--scale", choices=sorted(SCALES), action="append",
+                        help="Document scale to run (repeatable, default: small and medium).")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON lines file the results are appended to.")
+    parser.add_argument("--no-save", action="store_true", help="Do not append the results.")
+    parser.add_argument("--compare", nargs="?", const="", default=None, metavar="COMMIT",
+                        help="Compare with the latest results of COMMIT (default: of any other commit).")
+    args = parser.parse_args()
+
+    history = load_records(args.results)
+    for scale in args.scale or ["small", "medium"]:
+        record = run_suite(scale, args.repeat)
+        baseline = find_baseline(history, record, args.compare or None) if args.compare is not None else None
+        print_record(record, baseline)
+        if not args.no_save:
+            save_record(record, args.results)
@@ -1,55 +1,360 @@
 import requests
 import json
+import logging
+import re
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+from llm_cache import response_key
+from instrumentation import span
 
-def mistral_summarize(content):
+logger = logging.getLogger(__name__)
+
+OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
+MISTRAL_MODEL = "mistral"
+CONNECT_TIMEOUT = 5  # Seconds to establish a connection to the Ollama server
+READ_TIMEOUT = 120  # Seconds without any new response data before giving up on a generation
+MAX_RETRIES = 3  # Retries on connection errors and 429/5xx responses
+RETRY_BACKOFF = 0.5  # Retries wait 0.5s, 1s, 2s, ...
+STREAM_RETRIES = 2  # Generations restarted from scratch when the response stream breaks off midway
+POOL_SIZE = 8  # Keep-alive connections kept open to the server
+PROMPT_VERSION = 3  # Bump whenever the bullet point prompts change, so cached responses are not reused
+CONTEXT_WINDOW = 4096  # num_ctx: prompt and generated tokens together must fit in this
+# Fraction of the context window left unused, in case estimate_tokens undercounts; Ollama cuts an
+# overflowing prompt from the front, which would drop the instructions
+CONTEXT_HEADROOM = 0.15
+MAX_OUTPUT_TOKENS = 300  # num_predict: upper bound on generated tokens for one section's bullet points
+TEMPERATURE = 0.3
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+DIGIT = re.compile(r'\d')
+
+BULLET_POINT_PROMPT = (
+    "I am giving you a paragraph. Return a topic and summary in bullet points. "
+    "keep the points short and too the point"
+    "Strictly follow the format 'Topic: [topic goes here], Summary: bullet point 1, bullet point 2, bullet point 3, bullet point 4, bullet point 5'. "
+    "Make the bullet points concise and presentation-friendly.\n\n"
+    "Content:\n{content}"
+)
+
+class MistralClient:
+    """
+    Reusable client for the Ollama generate endpoint. Requests go through one pooled,
+    keep-alive session with connect/read timeouts and bounded retries with exponential
+    backoff. Responses are streamed, and the latency of every call (total and to the
+    first token) is recorded.
+    """
+    def __init__(self, url=OLLAMA_URL, model=MISTRAL_MODEL, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES, backoff_factor=RETRY_BACKOFF,
+                 pool_size=POOL_SIZE, context_window=CONTEXT_WINDOW, max_output_tokens=MAX_OUTPUT_TOKENS,
+                 temperature=TEMPERATURE, stream_retries=STREAM_RETRIES, context_headroom=CONTEXT_HEADROOM):
+        self.url = url
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.backoff_factor = backoff_factor
+        self.stream_retries = stream_retries
+        self.context_window = context_window
+        self.max_output_tokens = max_output_tokens
+        self.temperature = temperature
+        self.context_headroom = context_headroom
+
+        retry = Retry(
+            total=max_retries,
+            read=0,  # A generation that timed out would most likely time out again
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),  # Generating again is harmless
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update({'Content-Type': 'application/json'})
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.calls = 0
+        self.failures = 0
+        self.total_latency = 0.0
+        self.last_latency = None
+        self.last_first_token_latency = None
+        self._stats_lock = threading.Lock()
+
+    def stream(self, prompt, **params):
+        """
+        Send a prompt to the generate endpoint and yield the response text fragments as the
+        server produces them. Raises requests.exceptions.RequestException when the call fails
+        after retries; the read timeout applies to the gap between fragments, not the whole generation.
+        :param params: Extra fields for the request body (e.g. options, format).
+        """
+        data = {"model": self.model, "prompt": prompt, "stream": True}
+        data.update(params)
+
+        with span("llm_call", prompt_tokens=estimate_tokens(prompt), fragments=0) as call_span:
+            start = time.perf_counter()
+            first_token_latency = None
+            failed = True
+            try:
+                with self.session.post(self.url, json=data, timeout=self.timeout, stream=True) as response:
+                    response.raise_for_status()
+
+                    # The server sends one JSON object per line as tokens are generated
+                    for line in response.iter_lines(chunk_size=None):  # Each chunk of the chunked response as it arrives
+                        if not line:
+                            continue
+                        try:
+                            json_line = json.loads(line)
+                        except json.JSONDecodeError as e:
+                            logger.warning("Error decoding JSON: %s, skipping line: %r", e, line)
+                            continue
+                        if json_line.get('response'):
+                            if first_token_latency is None:
+                                first_token_latency = time.perf_counter() - start
+                            call_span.count("fragments")
+                            yield json_line['response']
+                        if json_line.get('done'):
+                            # Ollama's own token counts, when it reports them
+                            call_span.set(**{key: json_line[key] for key in ("prompt_eval_count", "eval_count")
+                                             if key in json_line})
+                            break
+                failed = False
+            finally:
+                latency = time.perf_counter() - start
+                with self._stats_lock:
+                    self.calls += 1
+                    self.failures += failed
+                    self.total_latency += latency
+                    self.last_latency = latency
+                    self.last_first_token_latency = first_token_latency
+                call_span.set(failed=int(failed))
+                if first_token_latency is not None:
+                    call_span.set(first_token_seconds=first_token_latency)
+                first_token = f", first token after {first_token_latency:.2f}s" if first_token_latency is not None else ""
+                logger.debug("Mistral call took %.2fs%s%s", latency, first_token, " (failed)" if failed else "")
+
+    def generate(self, prompt, **params):
+        """
+        Send a prompt to the generate endpoint and return the whole response text.
+        Raises requests.exceptions.RequestException when the call fails after retries.
+        """
+        return "".join(self.stream(prompt, **params))
+
+    def options(self, num_predict=None):
+        """
+        The Ollama `options` block: context size, output token limit and sampling temperature.
+        """
+        return {
+            "num_ctx": self.context_window,
+            "num_predict": num_predict if num_predict is not None else self.max_output_tokens,
+            "temperature": self.temperature,
+        }
+
+    def prompt_budget(self, num_predict=None):
+        """
+        Estimated prompt tokens that fit in the context window next to num_predict generated tokens
+        (default max_output_tokens), keeping context_headroom of the window free.
+        """
+        if num_predict is None:
+            num_predict = self.max_output_tokens
+        return int(self.context_window * (1 - self.context_headroom)) - num_predict
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def is_broken_stream(error):
+    """
+    Whether a RequestException means the connection dropped (e.g. the server restarted mid-response),
+    so generating again will probably succeed. Read timeouts are not: the server is just too slow.
+    urllib3 only retries failures before the response starts, so these are retried by the callers.
+    """
+    if isinstance(error, requests.exceptions.ChunkedEncodingError):
+        return True
+    # requests reports a read timeout in the middle of the body as a ConnectionError wrapping ReadTimeoutError
+    return isinstance(error, requests.exceptions.ConnectionError) and \
+        not any(isinstance(arg, ReadTimeoutError) for arg in error.args)
+
+def get_client():
+    """
+    Return the shared MistralClient, creating it on first use, so every call reuses its connections.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = MistralClient()
+        return _default_client
+
+def mistral_summarize(content, client=None, on_partial=None, cache=None):
     """
     Summarizes the given content using Mistral API.
     This function sends a request to the Mistral API and returns bullet points for presentation.
+    The content is trimmed to leave room for the client's max_output_tokens in its context window.
+    A generation whose stream breaks off midway is started again, up to client.stream_retries times.
+    :param client: MistralClient to send the request with; defaults to the shared client.
+    :param on_partial: Optional callback on_partial(text_so_far), called as each fragment of the
+                       response arrives, so callers can show bullet points while they are generated.
+    :param cache: Optional LLMCache; responses already generated for the same model, prompt
+                  and parameters are returned from it without calling the server.
     """
-    url = "http://127.0.0.1:11434/api/generate"
-    
-    headers = {
-        'Content-Type': 'application/json',
-    }
-    
+    if client is None:
+        client = get_client()
+
+    prompt = build_prompt(content, client.prompt_budget())
+    params = {"options": client.options()}
+
+    cache_key = response_key(client.model, PROMPT_VERSION, prompt, params) if cache is not None else None
+    if cache_key is not None:
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            if on_partial is not None:
+                on_partial(cached_text)
+            return cached_text
+
+    attempt = 0
+    while True:
+        try:
+            logger.debug("Sending request to Mistral (about %d prompt tokens)", estimate_tokens(prompt))
+            summarized_text = ""
+            for fragment in client.stream(prompt, **params):
+                summarized_text += fragment
+                if on_partial is not None:
+                    on_partial(summarized_text)
+            break
+        except requests.exceptions.RequestException as e:
+            if attempt >= client.stream_retries or not is_broken_stream(e):
+                logger.error("Error during Mistral API call: %s", e)
+                return None
+            attempt += 1
+            delay = client.backoff_factor * 2 ** (attempt - 1)
+            logger.warning("Mistral response broke off (%s), generating again in %.1fs (retry %d of %d)",
+                           e, delay, attempt, client.stream_retries)
+            if on_partial is not None:
+                on_partial("")  # The partial text is discarded; the new generation starts from scratch
+            time.sleep(delay)
+
+    if summarized_text.strip():
+        if cache_key is not None:
+            cache.put(cache_key, summarized_text.strip())
+        return summarized_text.strip()
+    else:
+        logger.warning("No valid response found.")
+        return None
+
+def estimate_tokens(text):
+    """
+    Conservative token count for Mistral's tokenizer: every digit is a token of its own, and other
+    text is counted at three characters per token (English prose averages about four).
+    """
+    digits = len(DIGIT.findall(text))
+    return digits + (len(text) - digits) // 3 + 1
+
+def fit_content(content, max_tokens):
+    """
+    Shorten content until its estimated token count fits in max_tokens.
+    Sentences are dropped lowest score first when the content carries sentence scores (a Summary
+    from summarize_sections), otherwise from the end; the rest stay in reading order. A single
+    sentence that still does not fit is cut off.
+    """
+    if estimate_tokens(content) <= max_tokens:
+        return content
+
+    sentences = getattr(content, "sentences", None)
+    scores = getattr(content, "scores", None)
+    if sentences is None or scores is None:
+        sentences = [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(content) if sentence.strip()]
+        scores = [-i for i in range(len(sentences))]  # Earlier sentences first
+
+    kept = set(range(len(sentences)))
+    tokens = sum(estimate_tokens(sentence + " ") for sentence in sentences)
+    for i in sorted(range(len(sentences)), key=lambda i: scores[i]):
+        if tokens <= max_tokens or len(kept) == 1:
+            break
+        kept.remove(i)
+        tokens -= estimate_tokens(sentences[i] + " ")
+
+    fitted = "".join(sentences[i] + " " for i in sorted(kept))
+    while fitted and estimate_tokens(fitted) > max_tokens:
+        # Cut in proportion to the overshoot; digits make the characters per token vary
+        fitted = fitted[:len(fitted) * max(0, max_tokens - 1) // estimate_tokens(fitted)]
+    logger.info("Trimmed content from about %d to %d tokens", estimate_tokens(content), estimate_tokens(fitted))
+    return fitted
+
+def build_prompt(content, max_prompt_tokens):
+    """
+    The bullet point prompt for content, with the content trimmed so the whole prompt fits in max_prompt_tokens.
+    """
+    preamble_tokens = estimate_tokens(BULLET_POINT_PROMPT.format(content=""))
+    return BULLET_POINT_PROMPT.format(content=fit_content(content, max_prompt_tokens - preamble_tokens))
+
+def _format_bullet_points(entry):
+    # One section of a batched JSON response, in the 'Topic: ...' line format of single-section responses
+    if not isinstance(entry, dict) or not isinstance(entry.get("topic"), str) or not isinstance(entry.get("bullets"), list):
+        return None
+    bullets = [bullet.strip() for bullet in entry["bullets"] if isinstance(bullet, str) and bullet.strip()]
+    if not bullets:
+        return None
+    return "\n".join([f"Topic: {entry['topic'].strip()}"] + [f"- {bullet}" for bullet in bullets])
+
+def mistral_summarize_batch(contents, client=None, cache=None):
+    """
+    Summarizes several paragraphs with one Mistral request that answers in JSON keyed by paragraph id.
+    Returns {id: bullet points} for the paragraphs that came back well-formed; ids that are missing
+    from the result (malformed or incomplete output, failed request) should be summarized one by one.
+    :param contents: Dictionary of paragraph id (str) to content.
+    :param client: MistralClient to send the request with; defaults to the shared client.
+    :param cache: Optional LLMCache for the raw JSON response.
+    """
+    if client is None:
+        client = get_client()
+
     prompt = (
-        "I am giving you a paragraph. Return a topic and summary in bullet points. "
-        "keep the points short and too the point"
-        "Strictly follow the format 'Topic: [topic goes here], Summary: bullet point 1, bullet point 2, bullet point 3, bullet point 4, bullet point 5'. "
-        "Make the bullet points concise and presentation-friendly.\n\n"
-        f"Content:\n{content}"
+        "I am giving you a JSON object that maps paragraph ids to paragraphs. For every paragraph, return a topic "
+        "and a summary in bullet points. Keep the points short, concise and presentation-friendly, at most 5 per paragraph. "
+        "Respond only with a JSON object that maps each paragraph id to an object of the form "
+        '{"topic": "topic goes here", "bullets": ["bullet point 1", "bullet point 2"]}.\n\n'
+        f"Paragraphs:\n{json.dumps(contents, ensure_ascii=False)}"
     )
 
-    data = {
-        "model": "mistral", 
-        "prompt": prompt,    
-        "temperature": 0.3,  
-        "max_tokens": 1000   
-    }
+    # Room for every paragraph's bullet points, within what is left of the context window after the headroom
+    prompt_tokens = estimate_tokens(prompt)
+    num_predict = min(client.max_output_tokens * len(contents), max(client.prompt_budget(0) - prompt_tokens, 1))
+    params = {"options": client.options(num_predict), "format": "json"}
+
+    cache_key = response_key(client.model, PROMPT_VERSION, prompt, params) if cache is not None else None
+    response_text = cache.get(cache_key) if cache_key is not None else None
+
+    if response_text is None:
+        try:
+            logger.debug("Sending batched request to Mistral for %d paragraphs", len(contents))
+            response_text = client.generate(prompt, **params)
+        except requests.exceptions.RequestException as e:
+            logger.error("Error during Mistral API call: %s", e)
+            return {}
 
     try:
-        print(f"Sending request to Mistral with prompt: {prompt}")
-        response = requests.post(url, json=data, headers=headers)
-        response.raise_for_status()
+        response = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        logger.warning("Malformed batched response from Mistral: %s", e)
+        return {}
+    if not isinstance(response, dict):
+        logger.warning("Malformed batched response from Mistral: not a JSON object")
+        return {}
 
-        # Parse the JSON response and return the summarized text
-        summarized_text = ""
-        lines = response.text.strip().splitlines()
+    results = {}
+    for content_id in contents:
+        bullet_points = _format_bullet_points(response.get(content_id))
+        if bullet_points is not None:
+            results[content_id] = bullet_points
 
-        for line in lines:
-            try:
-                json_line = json.loads(line)
-                if 'response' in json_line:
-                    summarized_text += json_line['response']
-            except json.JSONDecodeError as e:
-                print(f"Error decoding JSON: {e}, skipping line: {line}")
-
-        if summarized_text.strip():
-            return summarized_text.strip()
-        else:
-            print("No valid response found.")
-            return None
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error during Mistral API call: {e}")
-        return None
+    # Only cache responses that answered every paragraph
+    if cache_key is not None and len(results) == len(contents):
+        cache.put(cache_key, response_text)
+    return results
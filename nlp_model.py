@@ -0,0 +1,46 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SPACY_MODEL = "en_core_web_lg"  # Needs word vectors for sentence similarity
+SENTENCE_SEGMENTER = "parser"  # "parser" (dependency parse) or "sentencizer" (rule-based, much faster)
+
+# Components of the en_core_web_* pipelines; top_sentences only needs vectors and sentence boundaries
+PIPELINE_COMPONENTS = ["tok2vec", "tagger", "parser", "senter", "attribute_ruler", "lemmatizer", "ner"]
+PARSER_COMPONENTS = ["tok2vec", "parser"]
+
+_models = {}
+_models_lock = threading.Lock()
+
+def load_summarization_model(model_name=SPACY_MODEL, sentences=SENTENCE_SEGMENTER):
+    """
+    Load a spaCy pipeline slimmed down to what summarization uses: the tokenizer, the
+    word vectors and a sentence segmenter. NER, tagging and lemmatization are never loaded.
+    :param model_name: Installed spaCy model package.
+    :param sentences: "parser" to segment with the dependency parser, or "sentencizer"
+                      to skip every trained component and use rule-based boundaries.
+    """
+    # Imported here so summarizer backends that do not use spaCy never pay for importing it
+    import spacy
+
+    if sentences == "sentencizer":
+        nlp = spacy.load(model_name, exclude=PIPELINE_COMPONENTS)
+        nlp.add_pipe("sentencizer")
+    elif sentences == "parser":
+        nlp = spacy.load(model_name, exclude=[name for name in PIPELINE_COMPONENTS if name not in PARSER_COMPONENTS])
+    else:
+        raise ValueError(f"Unknown sentence segmenter: {sentences}")
+    logger.info("Loaded spaCy model '%s' with components %s", model_name, nlp.pipe_names)
+    return nlp
+
+def get_nlp(model_name=SPACY_MODEL, sentences=SENTENCE_SEGMENTER):
+    """
+    Return the shared summarization pipeline, loading it on first use.
+    Every caller in the process gets the same instance per (model, segmenter).
+    """
+    key = (model_name, sentences)
+    with _models_lock:
+        if key not in _models:
+            _models[key] = load_summarization_model(model_name, sentences)
+        return _models[key]
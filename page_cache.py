@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pdfminer.pdftypes import resolve1, PDFStream, PDFObjRef
+from pdf_document import ParsedPage, page_xobjects
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_VERSION = 3  # Bump whenever the cached page format or image extraction settings change
+
+def _stream_data(obj):
+    obj = resolve1(obj)
+    if isinstance(obj, PDFStream):
+        return obj.get_data() or b""
+    return b""
+
+def _hash_pdf_object(digest, obj, memo):
+    # Feed a canonical form of a PDF object into digest, following references and including stream data.
+    # memo maps object ids to their digests, so objects shared by many pages (fonts, images) are hashed once.
+    if isinstance(obj, PDFObjRef):
+        if obj.objid not in memo:
+            memo[obj.objid] = b"cycle"  # Placeholder while the object is being hashed
+            object_digest = hashlib.sha256()
+            _hash_pdf_object(object_digest, obj.resolve(), memo)
+            memo[obj.objid] = object_digest.digest()
+        digest.update(memo[obj.objid])
+    elif isinstance(obj, PDFStream):
+        _hash_pdf_object(digest, obj.attrs, memo)
+        digest.update(_stream_data(obj))
+    elif isinstance(obj, dict):
+        digest.update(b"<<")
+        for key in sorted(obj, key=str):
+            digest.update(b"/" + str(key).encode())
+            _hash_pdf_object(digest, obj[key], memo)
+        digest.update(b">>")
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b"[")
+        for item in obj:
+            _hash_pdf_object(digest, item, memo)
+        digest.update(b"]")
+    else:
+        digest.update(repr(obj).encode() + b" ")  # Numbers, names, strings
+
+def page_content_hash(page, memo=None):
+    """
+    Hash a page by its content stream(s), the XObjects (images, forms) it draws and its fonts
+    (including their ToUnicode maps, encodings and widths, which decide the extracted words).
+    Pages whose hash is unchanged produce the same words and images, so their
+    extraction results can be reused.
+    :param page: pdfplumber Page object.
+    :param memo: Optional dictionary shared by the pages of one document, so objects used
+                 on many pages are hashed only once.
+    """
+    if memo is None:
+        memo = {}
+    digest = hashlib.sha256()
+    digest.update(f"v{PAGE_CACHE_VERSION}:{page.width}x{page.height}".encode())
+
+    for stream in page.page_obj.contents:
+        digest.update(_stream_data(stream))
+
+    # Whole objects, so the fonts and images inside form XObjects count too
+    xobjects = page_xobjects(page)
+    for name in sorted(xobjects):
+        digest.update(str(name).encode())
+        _hash_pdf_object(digest, xobjects[name], memo)
+
+    resources = resolve1(page.page_obj.resources) or {}
+    digest.update(b"Font")
+    _hash_pdf_object(digest, resources.get("Font"), memo)
+
+    return digest.hexdigest()
+
+class PageCache:
+    """
+    On-disk cache of per-page extraction results: words (with size and fontname),
+    image bounding boxes and the extracted image files. Each page gets a directory
+    named after its content hash. Entries are evicted least recently used first once
+    the cache grows past `max_bytes`.
+    """
+    def __init__(self, cache_dir="page_cache", max_bytes=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._total_bytes = None  # Size of the cache as of the last eviction plus what was stored since
+        self._lock = threading.Lock()
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def page_key(self, page, memo=None):
+        return page_content_hash(page, memo)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load_page(self, key, page_num):
+        """
+        Return the cached ParsedPage for `key` renumbered to `page_num`, or None on a miss.
+        """
+        path = os.path.join(self._entry_dir(key), "page.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable page cache entry %s: %s", key, e)
+            return None
+        _touch(path)
+        images = [tuple(bbox) for bbox in data["images"]]
+        return ParsedPage(page_num, data["width"], data["height"], data["words"], images, data["image_names"],
+                          data.get("font_sizes"))
+
+    def store_page(self, key, parsed_page):
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        data = {
+            "width": parsed_page.width,
+            "height": parsed_page.height,
+            "words": [{k: v for k, v in word.items() if _is_json_value(v)} for word in parsed_page.words],
+            "images": [list(bbox) for bbox in parsed_page.images],
+            "image_names": parsed_page.image_names,
+            "font_sizes": parsed_page.font_sizes.tolist(),
+        }
+        path = os.path.join(entry_dir, "page.json")
+        _write_json_atomic(path, data)
+        self._stored(os.path.getsize(path))
+
+    def load_images(self, key, page_num, image_output_dir):
+        """
+        Copy the cached images of a page into `image_output_dir` under the current page
+        number and return their paths, or None if the page's images were never cached.
+        """
+        entry_dir = self._entry_dir(key)
+        path = os.path.join(entry_dir, "images.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached_names = json.load(f)
+            image_files = []
+            for img_index, cached_name in enumerate(cached_names):
+                extension = os.path.splitext(cached_name)[1]
+                image_filename = f"{image_output_dir}/page_{page_num+1}_image_{img_index+1}{extension}"
+                shutil.copyfile(os.path.join(entry_dir, cached_name), image_filename)
+                image_files.append(image_filename)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable image cache entry %s: %s", key, e)
+            return None
+        _touch(os.path.join(entry_dir, "page.json"))
+        return image_files
+
+    def store_images(self, key, image_files):
+        entry_dir = self._entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        cached_names = []
+        stored_bytes = 0
+        for img_index, image_file in enumerate(image_files):
+            cached_name = f"image_{img_index+1}{os.path.splitext(image_file)[1]}"
+            shutil.copyfile(image_file, os.path.join(entry_dir, cached_name))
+            cached_names.append(cached_name)
+            stored_bytes += os.path.getsize(image_file)
+        _write_json_atomic(os.path.join(entry_dir, "images.json"), cached_names)
+        self._stored(stored_bytes)
+
+    def _stored(self, n):
+        # Only walk the cache directory when the running total says it may have outgrown max_bytes
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += n
+            needs_eviction = self._total_bytes is None or self._total_bytes > self.max_bytes
+        if needs_eviction:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used page entries until the cache fits in `max_bytes`.
+        An entry's last use is the modification time of its page.json, touched on every load.
+        """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(key)
+            if not os.path.isdir(entry_dir):
+                continue
+            page_path = os.path.join(entry_dir, "page.json")
+            try:
+                last_used = os.path.getmtime(page_path if os.path.exists(page_path) else entry_dir)
+                size = sum(os.path.getsize(os.path.join(root, name))
+                           for root, _, names in os.walk(entry_dir) for name in names)
+            except OSError:
+                continue  # Removed by another job meanwhile
+            entries.append((last_used, size, entry_dir))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+        with self._lock:
+            self._total_bytes = total
+
+def _touch(path):
+    # Mark an entry as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _is_json_value(value):
+    return isinstance(value, (str, int, float, bool)) or value is None
+
+def _write_json_atomic(path, data):
+    # Write to a temporary file first so a crash never leaves a half-written entry
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
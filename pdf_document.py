@@ -0,0 +1,194 @@
+import logging
+import multiprocessing
+import numpy as np
+import pdfplumber
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pdfminer.pdftypes import resolve1
+from PIL import Image
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+class ParsedPage:
+    """
+    Words (with font size and font name) and image bounding boxes for a single PDF page.
+    """
+    def __init__(self, page_num, width, height, words, images, image_names=None, font_sizes=None):
+        self.page_num = page_num  # Zero-based page index
+        self.width = width
+        self.height = height
+        self.words = words  # Output of page.extract_words with 'fontname' and 'size'
+        # Font size of each word as an array, built once so heading detection needs no pass over the dicts
+        self.font_sizes = np.asarray(font_sizes, dtype=float) if font_sizes is not None else \
+            np.fromiter((word['size'] for word in words), dtype=float, count=len(words))
+        self.images = images  # List of (x0, top, x1, bottom) image bounding boxes
+        # XObject name of each image (None for inline images), used to find its embedded stream
+        self.image_names = image_names if image_names is not None else [None] * len(images)
+
+def parse_page(page, page_num):
+    """
+    Run layout analysis on a pdfplumber page and keep only what the pipeline needs.
+    :param page: pdfplumber Page object.
+    :param page_num: Zero-based page index.
+    """
+    words = page.extract_words(extra_attrs=['fontname', 'size'])
+    images = [(img['x0'], img['top'], img['x1'], img['bottom']) for img in page.images]
+    image_names = [_image_xobject_name(page, img) for img in page.images]
+    return ParsedPage(page_num, page.width, page.height, words, images, image_names)
+
+def page_xobjects(page):
+    """
+    The XObject resources (images, forms) of a pdfplumber page, keyed by name.
+    """
+    resources = resolve1(page.page_obj.resources) or {}
+    return resolve1(resources.get("XObject")) or {}
+
+def _image_xobject_name(page, img):
+    # Only images drawn straight from the page's own resources can be looked up by name;
+    # images nested in form XObjects or inline images get None.
+    name = img.get('name')
+    xobject = page_xobjects(page).get(name) if name else None
+    if xobject is not None and resolve1(xobject) is img.get('stream'):
+        return name
+    return None
+
+def parse_pages(filename, page_nums):
+    """
+    Open the PDF and parse only the given pages. Runs inside worker processes,
+    so it takes a filename rather than an open pdfplumber object.
+    """
+    with pdfplumber.open(filename) as pdf:
+        return [parse_page(pdf.pages[page_num], page_num) for page_num in page_nums]
+
+def pool_context():
+    """
+    Multiprocessing context for the extraction pools. Pools are started from worker threads of a
+    multi-threaded server, where fork would copy locks held by other threads (caches, span sinks,
+    other jobs) into the children in a locked state; forkserver and spawn start clean processes.
+    forkserver is not available on Windows, which uses spawn.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+def shard_page_numbers(page_count, workers, shards_per_worker=4):
+    """
+    Split page indices into contiguous shards. Several shards per worker keep the
+    pool busy when some pages are much heavier than others.
+    """
+    shard_count = max(1, min(page_count, workers * shards_per_worker))
+    shard_size = -(-page_count // shard_count)  # Ceiling division
+    return [list(range(start, min(start + shard_size, page_count)))
+            for start in range(0, page_count, shard_size)]
+
+class ParsedDocument:
+    """
+    A PDF that is opened once and shared by the stages of one user: the pipeline passes its
+    document to the section extractor, and the app's preview keeps its own.
+    Pages are parsed on first access to `pages` and the result is kept for the
+    lifetime of the document, so layout analysis runs at most once per page.
+    With workers > 1, pages are parsed in shards across a process pool.
+    With a PageCache, only pages whose content hash is not cached are parsed.
+    Page rasters are kept in a small LRU, so all images cropped from one page share a
+    single rendering, and a lower-resolution render reuses a cached higher-resolution one.
+    Not thread-safe: pdfplumber reads the file on demand, so use one document per thread.
+    """
+    def __init__(self, filename, workers=None, cache=None, max_rasters=4):
+        self.filename = filename
+        self.workers = workers
+        self.cache = cache
+        self.max_rasters = max_rasters
+        self.pdf = pdfplumber.open(filename)
+        self._pages = None
+        self._page_keys = None
+        self._rasters = OrderedDict()  # (page_num, resolution) -> PIL image
+
+    @property
+    def page_keys(self):
+        """
+        Content hash of every page, or None when no cache is configured.
+        """
+        if self._page_keys is None and self.cache is not None:
+            memo = {}  # Fonts and images shared between pages are hashed once
+            self._page_keys = [self.cache.page_key(page, memo) for page in self.pdf.pages]
+        return self._page_keys
+
+    @property
+    def pages(self):
+        if self._pages is None:
+            pages = [None] * len(self)
+            if self.cache is not None:
+                with span("page_cache_load", pages=len(pages)):
+                    for page_num, key in enumerate(self.page_keys):
+                        pages[page_num] = self.cache.load_page(key, page_num)
+
+            missing = [page_num for page_num, parsed_page in enumerate(pages) if parsed_page is None]
+            if self.cache is not None:
+                logger.info("Page cache: %d of %d pages unchanged.", len(pages) - len(missing), len(pages))
+
+            with span("page_parse", pages=len(missing), workers=self.workers or 1) as parse_span:
+                for parsed_page in self._parse_pages(missing):
+                    pages[parsed_page.page_num] = parsed_page
+                    parse_span.count("words", len(parsed_page.words))
+                    parse_span.count("images", len(parsed_page.images))
+                    if self.cache is not None:
+                        self.cache.store_page(self.page_keys[parsed_page.page_num], parsed_page)
+            self._pages = pages
+        return self._pages
+
+    def _parse_pages(self, page_nums):
+        if not (self.workers and self.workers > 1 and len(page_nums) > 1):
+            return [parse_page(self.pdf.pages[page_num], page_num) for page_num in page_nums]
+
+        shards = [[page_nums[i] for i in shard] for shard in shard_page_numbers(len(page_nums), self.workers)]
+        pages = []
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context()) as executor:
+            # map() yields shard results in submission order, so pages stay in order
+            for shard_pages in executor.map(parse_pages, [self.filename] * len(shards), shards):
+                pages.extend(shard_pages)
+        return pages
+
+    def __len__(self):
+        return len(self.pdf.pages)
+
+    def page(self, page_num):
+        """
+        Return the underlying pdfplumber page, e.g. for rendering.
+        """
+        return self.pdf.pages[page_num]
+
+    def render_page(self, page_num, resolution=300):
+        """
+        Rasterize a page into a PIL image, rendering it at most once per resolution.
+        If the page is already cached at a higher resolution, that raster is downscaled
+        instead of rendering the page again.
+        """
+        key = (page_num, resolution)
+        if key in self._rasters:
+            self._rasters.move_to_end(key)
+            return self._rasters[key]
+
+        higher = [(cached_resolution, raster) for (cached_num, cached_resolution), raster in self._rasters.items()
+                  if cached_num == page_num and cached_resolution > resolution]
+        if higher:
+            cached_resolution, raster = min(higher, key=lambda item: item[0])
+            scale = resolution / cached_resolution
+            size = (max(1, round(raster.width * scale)), max(1, round(raster.height * scale)))
+            return raster.resize(size, Image.LANCZOS)
+
+        with span("image_render", pages=1, resolution=resolution):
+            raster = self.page(page_num).to_image(resolution=resolution).original
+        self._rasters[key] = raster
+        while len(self._rasters) > self.max_rasters:
+            self._rasters.popitem(last=False)
+        return raster
+
+    def close(self):
+        self._rasters.clear()
+        self.pdf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,122 @@
+import os
+import logging
+import threading
+from contextlib import nullcontext
+from pptx import Presentation
+from pdf_document import ParsedDocument
+from extract_sections import extract_sections_and_images
+from result_cache import document_key
+from summarize_sections import (summarize_sections, send_to_mistral_for_bullet_points, BULLET_POINT_CONCURRENCY,
+                                BULLET_POINT_BATCH_TOKENS)
+from pptx_exp import create_presentation
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+_result_locks = {}
+_result_locks_guard = threading.Lock()
+
+def _result_lock(cache_key):
+    # One lock per document key, so concurrent jobs for the same PDF compute its results only once
+    with _result_locks_guard:
+        return _result_locks.setdefault(cache_key, threading.Lock())
+
+# Function to update the title in the first slide
+def update_presentation_title(prs, new_title):
+    # Access the first slide (usually the title slide)
+    first_slide = prs.slides[0]
+    # Access the title placeholder (placeholder 0)
+    title_placeholder = first_slide.shapes.title
+    if title_placeholder is not None:
+        title_placeholder.text = new_title
+
+def generate_presentation_from_pdf(pdf_path, template_path, output_path, selected_font, presentation_name=None,
+                                   work_dir=".", settings=None, result_cache=None, page_cache=None, progress=None,
+                                   summarizer="spacy", llm_concurrency=BULLET_POINT_CONCURRENCY,
+                                   on_partial_bullets=None, llm_cache=None, llm_batch_tokens=BULLET_POINT_BATCH_TOKENS,
+                                   image_preparer=None, workers=None):
+    """
+    Run the whole pipeline for one PDF: extract, summarize, generate bullet points and build the deck.
+    Does not touch Streamlit, so it can run in a background worker.
+    :param pdf_path: Path to the input PDF file.
+    :param template_path: Path to the PowerPoint template (.pptx).
+    :param output_path: Where the generated presentation is saved.
+    :param selected_font: Font used for slide text.
+    :param presentation_name: Optional title for the first slide.
+    :param work_dir: Directory for this run's intermediate files (extracted images).
+    :param settings: Pipeline settings that are part of the result cache key.
+    :param result_cache: Optional ResultCache for whole-document results.
+    :param page_cache: Optional PageCache for per-page extraction results.
+    :param progress: Optional callback progress(stage, fraction) called as stages start.
+    :param summarizer: Summarizer backend name ("spacy" or "tfidf"), see summarize_sections.
+    :param llm_concurrency: Concurrent bullet point requests to the Mistral server.
+    :param on_partial_bullets: Optional callback on_partial_bullets(section, text_so_far) called
+                               while bullet points are streamed from the Mistral server.
+    :param llm_cache: Optional LLMCache for Mistral responses.
+    :param llm_batch_tokens: Token budget for packing very short sections into Mistral requests (0 disables).
+    :param image_preparer: Optional ImagePreparer that sizes images for their slides (shared default otherwise).
+    :param workers: Worker processes for page parsing and image extraction; None or 1 extracts in this process.
+    """
+    def report(stage, fraction):
+        logger.info(stage)
+        if progress is not None:
+            progress(stage, fraction)
+
+    cache_key = document_key(pdf_path, settings or {}) if result_cache is not None else None
+    with _result_lock(cache_key) if cache_key is not None else nullcontext():
+        cached_results = result_cache.get(cache_key) if cache_key is not None else None
+
+        if cached_results is not None:
+            report("Using cached sections and bullet points...", 0.8)
+            content_dict, summarized_dict, bullet_point_dict = cached_results
+        else:
+            # Step 1: Extract sections and images from the PDF
+            report("Extracting sections and images from the PDF...", 0.05)
+            with span("extract") as extract_span, ParsedDocument(pdf_path, workers=workers, cache=page_cache) as document:
+                content_dict = extract_sections_and_images(
+                    pdf_path, image_output_dir=os.path.join(work_dir, "extracted_images"), document=document)
+                extract_span.set(pages=len(document), sections=len(content_dict))
+
+            # Step 2: Summarize the sections
+            report(f"Summarizing {len(content_dict)} sections...", 0.3)
+            with span("summarize", sections=len(content_dict), backend=summarizer):
+                summarized_dict = summarize_sections(content_dict, backend=summarizer)
+
+            # Step 3: Generate bullet points for sections
+            report("Generating bullet points...", 0.5)
+            with span("bullet_points", sections=len(summarized_dict)) as bullet_span:
+                hits_before, misses_before = (llm_cache.hits, llm_cache.misses) if llm_cache is not None else (0, 0)
+                bullet_point_dict = send_to_mistral_for_bullet_points(
+                    summarized_dict, max_workers=llm_concurrency, on_partial=on_partial_bullets, cache=llm_cache,
+                    batch_tokens=llm_batch_tokens)
+                if llm_cache is not None:
+                    # The cache is shared between jobs, so count only this run's lookups
+                    bullet_span.set(cache_hits=llm_cache.hits - hits_before, cache_misses=llm_cache.misses - misses_before)
+                    logger.info("Mistral response cache: %s", llm_cache.stats())
+
+            if result_cache is not None:
+                result_cache.put(cache_key, content_dict, summarized_dict, bullet_point_dict)
+
+    # Step 4: Prepare images dictionary
+    images_dict = {section: content.get("images", []) for section, content in content_dict.items()}
+
+    # Step 5: Load the chosen PowerPoint template
+    report("Generating the PowerPoint presentation...", 0.85)
+    prs = Presentation(template_path)
+
+    # Step 6: Update the title on the first slide with the presentation name
+    if presentation_name:
+        update_presentation_title(prs, presentation_name)
+
+    # Step 7: Generate the presentation
+    with span("slide_build", sections=len(bullet_point_dict)) as build_span:
+        create_presentation(prs, bullet_point_dict, images_dict, selected_font, image_preparer)
+        build_span.set(slides=len(prs.slides))
+
+    # Save the generated presentation
+    report("Saving the presentation...", 0.95)
+    with span("deck_save", slides=len(prs.slides)) as save_span:
+        prs.save(output_path)
+        save_span.set(bytes=os.path.getsize(output_path))
+    report("Presentation generation complete.", 1.0)
+    return output_path
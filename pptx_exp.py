@@ -1,6 +1,7 @@
 from pptx import Presentation
 from pptx.util import Inches, Pt
 import re
+from slide_images import get_image_preparer
 
 MAX_BULLETS_PER_SLIDE = 6  # Maximum number of bullet points per slide
 
@@ -45,7 +46,7 @@ def create_slide_without_images(prs, title, bullet_points, selected_font):
         p.level = 0  # Set bullet point level
 
 
-def create_slide_with_single_image(prs, title, bullet_points, selected_font, img_path):
+def create_slide_with_single_image(prs, title, bullet_points, selected_font, img_path, image_preparer=None):
     """
     Creates a slide with a title, bullet points, and a single image with customized positions.
     :param prs: PowerPoint presentation object.
@@ -53,6 +54,7 @@ def create_slide_with_single_image(prs, title, bullet_points, selected_font, img
     :param bullet_points: List of bullet points.
     :param selected_font: Font to be used for the text.
     :param img_path: Path to the image file.
+    :param image_preparer: ImagePreparer that sizes the image for its box; the shared one by default.
     """
     # Use a blank slide layout to have more control over positioning
     slide_layout = prs.slide_layouts[5]  # Using blank slide layout
@@ -91,10 +93,12 @@ def create_slide_with_single_image(prs, title, bullet_points, selected_font, img
     img_top = Inches(3.13)
     img_width = Inches(3)
     img_height = Inches(3)
+    image_preparer = image_preparer or get_image_preparer()
+    img_path = image_preparer.prepare(img_path, img_width, img_height)
     slide.shapes.add_picture(img_path, img_left, img_top, img_width, img_height)
 
 
-def create_slide_with_two_images(prs, title, bullet_points, selected_font, img_path1, img_path2):
+def create_slide_with_two_images(prs, title, bullet_points, selected_font, img_path1, img_path2, image_preparer=None):
     """
     Creates a slide with a title, bullet points, and two images using placeholders.
     :param prs: PowerPoint presentation object.
@@ -103,7 +107,9 @@ def create_slide_with_two_images(prs, title, bullet_points, selected_font, img_p
     :param selected_font: Font to be used for the text.
     :param img_path1: Path to the first image file.
     :param img_path2: Path to the second image file.
+    :param image_preparer: ImagePreparer that sizes the images for their boxes; the shared one by default.
     """
+    image_preparer = image_preparer or get_image_preparer()
     slide_layout = prs.slide_layouts[1]  # Layout with title and content placeholders
     slide = prs.slides.add_slide(slide_layout)
 
@@ -124,20 +130,21 @@ def create_slide_with_two_images(prs, title, bullet_points, selected_font, img_p
     top = Inches(1.5)
     width = Inches(3)
     height = Inches(3)
-    slide.shapes.add_picture(img_path1, left, top, width, height)
+    slide.shapes.add_picture(image_preparer.prepare(img_path1, width, height), left, top, width, height)
 
     # Add the second image
     left = Inches(6.5)
     top = Inches(4.5)
     width = Inches(3)
     height = Inches(3)
-    slide.shapes.add_picture(img_path2, left, top, width, height)
+    slide.shapes.add_picture(image_preparer.prepare(img_path2, width, height), left, top, width, height)
 
-def add_image_slide(prs, img_path):
+def add_image_slide(prs, img_path, image_preparer=None):
     """
     Add a slide with a single image.
     :param prs: PowerPoint presentation object.
     :param img_path: Path to the image file.
+    :param image_preparer: ImagePreparer that sizes the image for its box; the shared one by default.
     """
     # Add a blank slide layout
     slide = prs.slides.add_slide(prs.slide_layouts[6])  # Layout for blank slide
@@ -149,9 +156,10 @@ def add_image_slide(prs, img_path):
     height = Inches(5.5)
 
     # Add the image to the slide
-    slide.shapes.add_picture(img_path, left, top, width, height)
+    image_preparer = image_preparer or get_image_preparer()
+    slide.shapes.add_picture(image_preparer.prepare(img_path, width, height), left, top, width, height)
 
-def create_presentation(prs, summarized_dict, images_dict, selected_font):
+def create_presentation(prs, summarized_dict, images_dict, selected_font, image_preparer=None):
     """
     Creates a PowerPoint presentation from the summarized dictionary and adds images.
     Handles different cases: no images, single image, two images, and more.
@@ -159,7 +167,11 @@ def create_presentation(prs, summarized_dict, images_dict, selected_font):
     :param summarized_dict: Dictionary with section titles as keys and bullet points as values.
     :param images_dict: Dictionary with section titles as keys and image paths as values.
     :param selected_font: Selected font for text.
+    :param image_preparer: ImagePreparer that downsamples and recompresses images for their picture boxes;
+        the shared one (slide_images.get_image_preparer) by default.
     """
+    image_preparer = image_preparer or get_image_preparer()
+
     def split_bullet_points(bullet_points, max_points=MAX_BULLETS_PER_SLIDE):
         """
         Splits the bullet points into chunks of max_points per chunk.
@@ -179,13 +191,15 @@ def create_presentation(prs, summarized_dict, images_dict, selected_font):
                 create_slide_without_images(prs, section_title, bullet_chunk, selected_font)
         elif len(images) == 1:  # One image
             for idx, bullet_chunk in enumerate(bullet_point_chunks):
-                create_slide_with_single_image(prs, section_title, bullet_chunk, selected_font, images[0])
+                create_slide_with_single_image(prs, section_title, bullet_chunk, selected_font, images[0],
+                                               image_preparer)
         elif len(images) == 2:  # Two images
             for idx, bullet_chunk in enumerate(bullet_point_chunks):
-                create_slide_with_two_images(prs, section_title, bullet_chunk, selected_font, images[0], images[1])
+                create_slide_with_two_images(prs, section_title, bullet_chunk, selected_font, images[0], images[1],
+                                             image_preparer)
         else:  # More than two images
             for img_path in images:
-                add_image_slide(prs, img_path)
+                add_image_slide(prs, img_path, image_preparer)
 
     # # Save the presentation
     # prs.save("presentation_output.pptx")
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_VERSION = 1  # Bump whenever the cached result format changes
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def document_key(pdf_path, settings):
+    """
+    Cache key for a PDF processed with the given pipeline settings.
+    :param pdf_path: Path to the PDF file.
+    :param settings: JSON-serializable dictionary of everything that affects the results
+                     (extraction, summarization and LLM settings).
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{RESULT_CACHE_VERSION}:{file_hash(pdf_path)}:".encode())
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    On-disk cache of whole-document pipeline results: the content_dict from
+    extract_sections_and_images (with its images copied into the cache), the
+    summarized_dict and the bullet_point_dict. Entries are evicted least recently
+    used first once the cache grows past `max_bytes`.
+    """
+    def __init__(self, cache_dir="result_cache", max_bytes=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """
+        Return (content_dict, summarized_dict, bullet_point_dict) for `key`, or None on a miss.
+        """
+        path = os.path.join(self._entry_dir(key), "result.json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable result cache entry %s: %s", key, e)
+            return None
+        return data["content_dict"], data["summarized_dict"], data["bullet_point_dict"]
+
+    def put(self, key, content_dict, summarized_dict, bullet_point_dict):
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(os.path.join(tmp_dir, "images"))
+
+        # Copy images into the entry so it does not depend on the extraction directory
+        cached_content = {}
+        image_count = 0
+        for section, content in content_dict.items():
+            images = []
+            for image_path in content.get("images", []):
+                image_count += 1
+                image_name = f"{image_count}_{os.path.basename(image_path)}"
+                shutil.copyfile(image_path, os.path.join(tmp_dir, "images", image_name))
+                images.append(os.path.join(entry_dir, "images", image_name))
+            cached_content[section] = {"text": content.get("text", ""), "images": images}
+
+        with open(os.path.join(tmp_dir, "result.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "created": time.time(),
+                "content_dict": cached_content,
+                "summarized_dict": dict(summarized_dict),
+                "bullet_point_dict": dict(bullet_point_dict),
+            }, f)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Another writer stored the same key first; its entry is just as good
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in `max_bytes`.
+        """
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(key)
+            result_path = os.path.join(entry_dir, "result.json")
+            if not os.path.exists(result_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(root, name))
+                       for root, _, names in os.walk(entry_dir) for name in names)
+            entries.append((os.path.getmtime(result_path), size, entry_dir))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
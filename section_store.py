@@ -0,0 +1,81 @@
+from collections.abc import Mapping
+
+class Section:
+    """
+    One section of a document. The body text is not stored here: `start` and `end` are
+    character offsets into the SectionStore's shared text buffer.
+    """
+    __slots__ = ("title", "start", "end", "first_page", "last_page", "images")
+
+    def __init__(self, title, start, end, first_page, last_page, images):
+        self.title = title
+        self.start = start
+        self.end = end
+        self.first_page = first_page  # Zero-based, inclusive
+        self.last_page = last_page
+        self.images = images  # List of image file paths
+
+    def __repr__(self):
+        return f"Section({self.title!r}, pages {self.first_page + 1}-{self.last_page + 1}, {len(self.images)} images)"
+
+class SectionStore:
+    """
+    Sections of a document in reading order, backed by a single text buffer.
+    Section text is only sliced out of the buffer when asked for, and a repeated
+    heading is kept as a separate section rather than merged into the earlier one.
+    """
+    __slots__ = ("text", "sections")
+
+    def __init__(self, text, sections):
+        self.text = text
+        self.sections = sections
+
+    def __len__(self):
+        return len(self.sections)
+
+    def __iter__(self):
+        return iter(self.sections)
+
+    def section_text(self, section):
+        return self.text[section.start:section.end]
+
+    def as_content_dict(self):
+        """
+        Dictionary-style view ({title: {"text": ..., "images": [...]}}) for existing callers.
+        """
+        return ContentView(self)
+
+class ContentView(Mapping):
+    """
+    Read-only mapping of section title to {"text": ..., "images": [...]}, the shape that
+    extract_sections_and_images has always returned. Values are built on access.
+    Repeated headings are disambiguated as "Title (2)", "Title (3)", ..., skipping numbers
+    taken by other keys (including real headings such as "Title (2)").
+    """
+    __slots__ = ("store", "_index")
+
+    def __init__(self, store):
+        self.store = store
+        self._index = {}
+        seen = {}
+        for section in store.sections:
+            count = seen.get(section.title, 0) + 1
+            key = section.title if count == 1 else f"{section.title} ({count})"
+            while key in self._index:
+                count += 1
+                key = f"{section.title} ({count})"
+            seen[section.title] = count
+            self._index[key] = section
+
+    def __getitem__(self, key):
+        section = self._index[key]
+        return {"text": self.store.section_text(section), "images": list(section.images)}
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return f"ContentView({list(self._index)!r})"
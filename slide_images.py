@@ -0,0 +1,169 @@
+import hashlib
+import io
+import logging
+import math
+import os
+import threading
+from PIL import Image
+from pptx.util import Inches
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+SLIDE_IMAGE_DPI = 150  # Pixels per inch of picture box; enough for a projector or a laptop screen
+JPEG_QUALITY = 85
+PALETTE_COLORS = 256  # Images with more colors than this are photos (JPEG); with fewer, could be either
+PNG_SIZE_RATIO = 2  # A few-color image stays lossless PNG unless that is over this many times the JPEG size
+FORMAT_SAMPLE_SIZE = 256  # Side of the center crop both formats are tried on
+IMAGE_CACHE_VERSION = 1  # Bump whenever the conversion changes
+EMU_PER_INCH = Inches(1)
+
+def encode_image(image, jpeg_quality=JPEG_QUALITY):
+    """
+    Encode a PIL image for a slide and return (bytes, extension).
+    Images with transparency are PNG. Photos, renders and gradients (many colors) are JPEG.
+    Few-color images are usually line art (charts, diagrams, screenshots), where JPEG blurs edges:
+    they stay PNG unless the PNG is over PNG_SIZE_RATIO times the JPEG (judged on a center crop),
+    as for grayscale photos.
+    """
+    def encode(image, image_format):
+        buffer = io.BytesIO()
+        if image_format == "JPEG":
+            image.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+        else:
+            image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    if image.mode in ("RGBA", "LA") and image.getchannel("A").getextrema()[0] < 255:
+        return encode(image, "PNG"), ".png"
+    if image.mode in ("RGBA", "LA"):
+        image = image.convert("RGB" if image.mode == "RGBA" else "L")  # Drop the unused alpha channel
+    if image.getcolors(maxcolors=PALETTE_COLORS) is None:
+        return encode(image, "JPEG"), ".jpg"
+
+    left = max(0, (image.width - FORMAT_SAMPLE_SIZE) // 2)
+    top = max(0, (image.height - FORMAT_SAMPLE_SIZE) // 2)
+    sample = image.crop((left, top, left + min(image.width, FORMAT_SAMPLE_SIZE), top + min(image.height, FORMAT_SAMPLE_SIZE)))
+    if len(encode(sample, "PNG")) <= PNG_SIZE_RATIO * len(encode(sample, "JPEG")):
+        return encode(image, "PNG"), ".png"
+    return encode(image, "JPEG"), ".jpg"
+
+class ImagePreparer:
+    """
+    Prepares images for embedding: each image is downsampled to the pixel size its picture box
+    needs at `dpi` and stored as JPEG or PNG depending on its content. Converted variants are kept
+    in `cache_dir` (keyed by image content, box size and settings) and remembered in memory, so
+    preparing the same image for the same box again costs nothing.
+    Least recently used variants are deleted when the cache is opened and holds more than `max_bytes`.
+    """
+    def __init__(self, cache_dir="image_cache", dpi=SLIDE_IMAGE_DPI, jpeg_quality=JPEG_QUALITY, max_bytes=1 << 30):
+        self.dpi = dpi
+        self.cache_dir = cache_dir
+        self.jpeg_quality = jpeg_quality
+        self.max_bytes = max_bytes
+        self._prepared = {}  # (path, mtime, size, box width, box height) -> prepared path
+        self._lock = threading.Lock()
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.evict()
+
+    def prepare(self, img_path, width, height):
+        """
+        Return the path of a version of img_path sized for a width x height picture box (in EMU,
+        e.g. Inches(3)). Images that are already small enough, or cannot be read, are returned unchanged.
+        """
+        try:
+            stat = os.stat(img_path)
+        except OSError:
+            return img_path  # Let add_picture report the missing file
+        memo_key = (img_path, stat.st_mtime_ns, stat.st_size, int(width), int(height))
+        with self._lock:
+            prepared = self._prepared.get(memo_key)
+        if prepared is None or not os.path.exists(prepared):
+            prepared = self._prepare(img_path, width, height)
+            with self._lock:
+                self._prepared[memo_key] = prepared
+        return prepared
+
+    def _prepare(self, img_path, width, height):
+        target = (math.ceil(width / EMU_PER_INCH * self.dpi), math.ceil(height / EMU_PER_INCH * self.dpi))
+        with open(img_path, "rb") as f:
+            data = f.read()
+
+        digest = hashlib.sha256(f"v{IMAGE_CACHE_VERSION}:{target}:{self.jpeg_quality}:".encode())
+        digest.update(data)
+        key = digest.hexdigest()
+        for extension in (".jpg", ".png"):
+            cached_path = os.path.join(self.cache_dir, key + extension)
+            if os.path.exists(cached_path):
+                os.utime(cached_path)  # Mark as recently used
+                return cached_path
+
+        with span("image_prepare", bytes_in=len(data)) as prepare_span:
+            try:
+                image = Image.open(io.BytesIO(data))
+                source_format = image.format
+                # Scale so the image still covers the box at `dpi` in both directions; never upscale
+                scale = max(target[0] / image.width, target[1] / image.height)
+                if scale >= 1 and source_format in ("JPEG", "PNG"):
+                    return img_path
+                if source_format == "JPEG":
+                    image.draft("RGB", target)  # Let the decoder skip detail the box cannot show
+                image.load()
+            except Exception as e:
+                logger.warning("Could not read image %s, embedding it unchanged: %s", img_path, e)
+                return img_path
+
+            if image.mode not in ("RGB", "RGBA", "L", "LA"):
+                has_alpha = image.mode in ("PA", "RGBa") or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+            if scale < 1:
+                # Relative to the decoded size, which draft() may already have reduced
+                scale = max(target[0] / image.width, target[1] / image.height)
+                size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+                image = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+            encoded, extension = encode_image(image, self.jpeg_quality)
+            if source_format in ("JPEG", "PNG") and len(encoded) >= len(data):
+                # The original is already compressed better (e.g. a flat PNG figure): keep its bytes
+                encoded, extension = data, (".png" if source_format == "PNG" else ".jpg")
+            cached_path = os.path.join(self.cache_dir, key + extension)
+            tmp_path = f"{cached_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(encoded)
+            os.replace(tmp_path, cached_path)
+            prepare_span.set(bytes_out=len(encoded))
+        return cached_path
+
+    def evict(self):
+        """
+        Delete least recently used variants until the cache fits in `max_bytes`.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith((".jpg", ".png")):
+                entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+_default_preparer = None
+_default_preparer_lock = threading.Lock()
+
+def get_image_preparer():
+    """
+    Return the shared ImagePreparer, creating it on first use.
+    """
+    global _default_preparer
+    with _default_preparer_lock:
+        if _default_preparer is None:
+            _default_preparer = ImagePreparer()
+        return _default_preparer
@@ -1,71 +1,411 @@
 import os
+import logging
 from pptx import Presentation
 from extract_sections import extract_sections_and_images
-from mistral_summarizer import mistral_summarize
+from mistral_summarizer import mistral_summarize, mistral_summarize_batch, estimate_tokens
 from pptx_exp import create_presentation
-import spacy
+from nlp_model import get_nlp
+from instrumentation import span
+import numpy as np
 import re 
+from concurrent.futures import ThreadPoolExecutor
 
-# Load spaCy model
-nlp = spacy.load('en_core_web_lg')
+logger = logging.getLogger(__name__)
 
-def top_sentences(text):
-    summarized_text = ""
-    try:
-        # Clean up the text before processing
-        text = re.sub(r'\[\d+]+' , '', text)
-        text = text.replace("\n", " ")
+TOP_SENTENCES = 5  # Sentences kept per section summary
+MAX_CHUNK_CHARS = 50000  # Longer section texts are summarized chunk by chunk, then the chunk summaries are reduced
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+BULLET_POINT_CONCURRENCY = 4  # Concurrent Mistral requests; match the server's parallel slots (OLLAMA_NUM_PARALLEL)
+BULLET_POINT_BATCH_TOKENS = 1500  # Summaries are packed into one Mistral request up to this many (estimated) tokens
+BULLET_POINT_BATCH_SECTION_TOKENS = 100  # Only summaries shorter than this are packed; longer ones are streamed alone
 
-        # Process text using spaCy
-        doc = nlp(text)
-        
-        # Create a list of (sentence, score) tuples based on sentence similarity
-        sentences = [(sent.text.strip(), sent.similarity(doc)) for sent in doc.sents]
+def clean_text(text):
+    # Clean up the text before processing
+    text = re.sub(r'\[\d+]+' , '', text)
+    return text.replace("\n", " ")
+
+class Summary(str):
+    """
+    A summary's text (its sentences joined in reading order) that also carries each sentence's score,
+    so a prompt builder can drop the least relevant sentences first when it has to shorten it.
+    """
+    def __new__(cls, sentences=(), scores=()):
+        summary = super().__new__(cls, "".join(sentence + " " for sentence in sentences))
+        summary.sentences = list(sentences)
+        summary.scores = [float(score) for score in scores]
+        return summary
+
+    def __reduce__(self):
+        return Summary, (self.sentences, self.scores)
+
+def score_sentences(doc):
+    """
+    Cosine similarity of every sentence to the whole Doc, computed as one matrix operation.
+    Returns (sentences, scores) with sentences in document order.
+    """
+    sentences = list(doc.sents)
+    if not sentences:
+        return sentences, np.zeros(0)
+
+    sentence_vectors = np.stack([sent.vector for sent in sentences])
+    doc_vector = doc.vector
+    norms = np.linalg.norm(sentence_vectors, axis=1) * np.linalg.norm(doc_vector)
+
+    # Like Span.similarity, a sentence (or Doc) without a vector scores 0
+    scores = np.zeros(len(sentences))
+    np.divide(sentence_vectors @ doc_vector, norms, out=scores, where=norms > 0)
+    return sentences, scores
+
+def select_top(scores, k):
+    """
+    Indices of the k highest scores, in ascending (reading) order.
+    """
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    return np.sort(np.argpartition(-scores, k - 1)[:k])
 
-        # Sort sentences by similarity and pick the top 5
-        top_sentences = sorted(sentences, key=lambda x: x[1], reverse=True)[:5]
+def summarize_doc(doc, k=TOP_SENTENCES):
+    """
+    Picks the top k sentences of an already processed spaCy Doc, based on similarity to the whole Doc,
+    and returns them in their original reading order.
+    """
+    sentences, scores = score_sentences(doc)
 
-        # Combine the top sentences into the final summarized text
-        for sentence, score in top_sentences:
-            summarized_text += sentence + " "
+    # Combine the top sentences into the final summarized text
+    selected = select_top(scores, k)
+    return Summary([sentences[i].text.strip() for i in selected], scores[selected])
+
+def top_sentences(text, nlp=None, k=TOP_SENTENCES):
+    """
+    Summarizes the given text using the top k sentences based on similarity, in reading order.
+    :param nlp: spaCy pipeline to use; defaults to the shared, lazily loaded summarization model.
+    :param k: Number of sentences to keep.
+    """
+    if nlp is None:
+        nlp = get_nlp()
+
+    summarized_text = ""
+    try:
+        # Process text using spaCy
+        doc = nlp(clean_text(text))
+        summarized_text = summarize_doc(doc, k)
 
     except Exception as e:
-        print(f"Error in summarizing text: {e}")
+        logger.error("Error in summarizing text: %s", e)
 
     return summarized_text
 
-def summarize_sections(content_dict):
+class SummarizerBackend:
+    """
+    Extractive summarizer interface: turns section texts into their top k sentences.
+    Subclasses implement summarize_many, which gets all texts of a run at once so it can batch.
+    """
+    name = None
+
+    def summarize(self, text, k=TOP_SENTENCES):
+        return self.summarize_many([text], k)[0]
+
+    def summarize_many(self, texts, k=TOP_SENTENCES):
+        raise NotImplementedError
+
+class SpacySimilarityBackend(SummarizerBackend):
+    """
+    Scores sentences by word-vector similarity to the whole text, using a spaCy model with vectors.
+    Texts are streamed through nlp.pipe in batches (optionally over several processes).
+    """
+    name = "spacy"
+
+    def __init__(self, nlp=None, batch_size=32, n_process=1):
+        self.nlp = nlp
+        self.batch_size = batch_size
+        self.n_process = n_process
+
+    def summarize_many(self, texts, k=TOP_SENTENCES):
+        nlp = self.nlp if self.nlp is not None else get_nlp()
+
+        def cleaned_texts():
+            for text in texts:
+                text = clean_text(text)
+                if len(text) > nlp.max_length:
+                    # nlp.pipe would fail the whole batch on this text; summarize_sections chunks long texts first
+                    logger.error("Error in summarizing text: text of %d characters exceeds nlp.max_length", len(text))
+                    text = ""
+                parse_span.count("chars", len(text))
+                yield text
+
+        summaries = []
+        with span("spacy_parse", n_process=self.n_process) as parse_span:
+            for doc in nlp.pipe(cleaned_texts(), batch_size=self.batch_size, n_process=self.n_process):
+                try:
+                    summaries.append(summarize_doc(doc, k))
+                except Exception as e:
+                    logger.error("Error in summarizing text: %s", e)
+                    summaries.append("")
+            parse_span.set(texts=len(summaries))
+        return summaries
+
+class TfidfBackend(SummarizerBackend):
+    """
+    Scores sentences by TF-IDF cosine similarity to the whole text, with NumPy only.
+    Needs no language model or word vectors, so it loads instantly and uses little memory.
+    """
+    name = "tfidf"
+
+    TOKEN = re.compile(r'[a-z0-9]+')
+
+    def summarize_many(self, texts, k=TOP_SENTENCES):
+        summaries = []
+        with span("tfidf_score") as score_span:
+            for text in texts:
+                sentences = [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(clean_text(text))
+                             if sentence.strip()]
+                scores = self.score_sentences(sentences)
+                selected = select_top(scores, k)
+                summaries.append(Summary([sentences[i] for i in selected], scores[selected]))
+                score_span.count("sentences", len(sentences))
+            score_span.set(texts=len(summaries))
+        return summaries
+
+    def score_sentences(self, sentences):
+        """
+        Cosine similarity between each sentence's TF-IDF vector and the text's TF-IDF vector.
+        Works on flat (sentence, term) arrays, so memory is linear in the number of words.
+        """
+        tokens = [self.TOKEN.findall(sentence.lower()) for sentence in sentences]
+        sentence_ids = np.repeat(np.arange(len(sentences)), [len(sentence_tokens) for sentence_tokens in tokens])
+        if not len(sentence_ids):
+            return np.zeros(len(sentences))
+
+        vocabulary = {}
+        term_ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary))
+                                for sentence_tokens in tokens for token in sentence_tokens),
+                               dtype=np.int64, count=len(sentence_ids))
+        term_count = len(vocabulary)
+
+        # Term frequency of every distinct (sentence, term) pair
+        pairs, term_frequency = np.unique(sentence_ids * term_count + term_ids, return_counts=True)
+        pair_sentences, pair_terms = np.divmod(pairs, term_count)
+
+        # Smoothed inverse document frequency, treating each sentence as a document
+        document_frequency = np.bincount(pair_terms, minlength=term_count)
+        idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1
+        weights = term_frequency * idf[pair_terms]
+
+        text_vector = np.bincount(pair_terms, weights=weights, minlength=term_count)
+        dots = np.bincount(pair_sentences, weights=weights * text_vector[pair_terms], minlength=len(sentences))
+        norms = np.sqrt(np.bincount(pair_sentences, weights=weights ** 2, minlength=len(sentences)))
+        norms *= np.linalg.norm(text_vector)
+
+        scores = np.zeros(len(sentences))
+        np.divide(dots, norms, out=scores, where=norms > 0)
+        return scores
+
+SUMMARIZER_BACKENDS = {backend.name: backend for backend in (SpacySimilarityBackend, TfidfBackend)}
+
+def get_summarizer_backend(backend="spacy", **options):
     """
-    Summarizes each section from the content_dict using spaCy.
+    Return a SummarizerBackend instance.
+    :param backend: Backend name ("spacy" or "tfidf") or an existing SummarizerBackend.
+    :param options: Constructor arguments for the named backend.
     """
+    if isinstance(backend, SummarizerBackend):
+        return backend
+    if backend not in SUMMARIZER_BACKENDS:
+        raise ValueError(f"Unknown summarizer backend '{backend}', choose from {sorted(SUMMARIZER_BACKENDS)}")
+    return SUMMARIZER_BACKENDS[backend](**options)
+
+def split_into_chunks(text, max_chars=MAX_CHUNK_CHARS):
+    """
+    Split text into chunks of at most max_chars, at sentence boundaries where possible.
+    Always returns at least one chunk (which may be empty).
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    pieces = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        # A single "sentence" longer than a chunk (e.g. a table without punctuation) is cut at a space
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        pieces.append(sentence)
+
+    chunks = []
+    current, current_size = [], 0
+    for piece in pieces:
+        if current and current_size + len(piece) + 1 > max_chars:
+            chunks.append(" ".join(current))
+            current, current_size = [], 0
+        current.append(piece)
+        current_size += len(piece) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def summarize_sections(content_dict, batch_size=32, n_process=1, nlp=None, k=TOP_SENTENCES, backend="spacy",
+                       max_chunk_chars=MAX_CHUNK_CHARS):
+    """
+    Summarizes each section from the content_dict with the chosen summarizer backend.
+    With the spaCy backend, all section texts are streamed through nlp.pipe, so spaCy processes
+    them in batches (optionally over several processes) instead of one nlp() call per section.
+    Sections longer than max_chunk_chars are summarized map-reduce style: each chunk is summarized
+    (together with all other texts, so chunks are batched and spread over the processes too),
+    then the joined chunk summaries are summarized again until one summary per section remains.
+    :param batch_size: Number of section texts per nlp.pipe batch (spaCy backend).
+    :param n_process: Number of processes nlp.pipe uses (spaCy backend).
+    :param nlp: spaCy pipeline to use; defaults to the shared, lazily loaded summarization model.
+    :param k: Number of sentences to keep per section.
+    :param backend: "spacy", "tfidf" or a SummarizerBackend instance.
+    :param max_chunk_chars: Maximum number of characters summarized in one piece.
+    """
+    if backend == "spacy":
+        backend = get_summarizer_backend(backend, nlp=nlp, batch_size=batch_size, n_process=n_process)
+    else:
+        backend = get_summarizer_backend(backend)
+
+    sections = list(content_dict)
+
+    # Map: summarize every chunk of every section in one stream
+    chunk_owners = []
+
+    def section_chunks():
+        for index, section in enumerate(sections):
+            for chunk in split_into_chunks(content_dict[section].get("text", ""), max_chunk_chars):
+                chunk_owners.append(index)
+                yield chunk
+
+    chunk_summaries = backend.summarize_many(section_chunks(), k)
+    section_parts = [[] for _ in sections]
+    for index, chunk_summary in zip(chunk_owners, chunk_summaries):
+        section_parts[index].append(chunk_summary)
+
+    # Reduce: summarize the joined chunk summaries of long sections until each has a single summary
+    while True:
+        long_sections = [index for index, parts in enumerate(section_parts) if len(parts) > 1]
+        if not long_sections:
+            break
+        logger.info("Reducing chunk summaries of %d long sections...", len(long_sections))
+
+        reduce_chunks = {}
+        for index in long_sections:
+            chunks = split_into_chunks(" ".join(section_parts[index]), max_chunk_chars)
+            # Chunk summaries that no longer shrink are cut down to their first chunk, so this always ends
+            reduce_chunks[index] = chunks if len(chunks) < len(section_parts[index]) else chunks[:1]
+
+        chunk_owners = [index for index in long_sections for _ in reduce_chunks[index]]
+        with span("summarize_reduce", sections=len(long_sections), chunks=len(chunk_owners)):
+            chunk_summaries = backend.summarize_many([chunk for index in long_sections for chunk in reduce_chunks[index]], k)
+        for index in long_sections:
+            section_parts[index] = []
+        for index, chunk_summary in zip(chunk_owners, chunk_summaries):
+            section_parts[index].append(chunk_summary)
+
     summarized_dict = {}
-    
-    for section, content in content_dict.items():
-        text = content.get("text", "")
-        summarized_text = top_sentences(text)
+    for section, parts in zip(sections, section_parts):
+        summarized_text = parts[0]
         summarized_dict[section] = summarized_text
-        print(f"Summarized text for section '{section}': {summarized_text}")
+        logger.debug("Summarized text for section '%s': %s", section, summarized_text)
 
     return summarized_dict
 
-def send_to_mistral_for_bullet_points(summarized_dict):
+def pack_sections(summarized_dict, batch_tokens=BULLET_POINT_BATCH_TOKENS,
+                  section_tokens=BULLET_POINT_BATCH_SECTION_TOKENS, min_batches=BULLET_POINT_CONCURRENCY):
+    """
+    Group sections with a summary into batches, keeping document order. Only summaries under
+    section_tokens (estimated) are packed; every other section gets a batch of its own, so it is
+    streamed and generated in parallel with the rest. Packed batches fit in batch_tokens and are
+    kept small enough that there are at least min_batches batches in all, one per server slot.
+    """
+    sections = [section for section, summary in summarized_dict.items() if summary]
+    tokens = {section: estimate_tokens(summarized_dict[section]) for section in sections}
+    short_sections = [section for section in sections if tokens[section] < section_tokens]
+    spare_batches = max(1, min_batches - (len(sections) - len(short_sections)))
+    short_tokens = sum(tokens[section] for section in short_sections)
+    batch_limit = min(batch_tokens, -(-short_tokens // spare_batches))  # Ceiling division
+
+    batches = []
+    current, current_tokens = None, 0
+    for section in sections:
+        if tokens[section] >= section_tokens:
+            batches.append([section])
+            continue
+        if current is None or current_tokens + tokens[section] > batch_limit:
+            current, current_tokens = [], 0
+            batches.append(current)
+        current.append(section)
+        current_tokens += tokens[section]
+    return batches
+
+def send_to_mistral_for_bullet_points(summarized_dict, max_workers=BULLET_POINT_CONCURRENCY, on_partial=None,
+                                      cache=None, batch_tokens=BULLET_POINT_BATCH_TOKENS, client=None):
     """
     Sends each section (already summarized using spaCy) to Mistral for bullet points generation.
+    Short sections (see pack_sections) are packed into requests with JSON output keyed by section;
+    sections missing from a malformed batched response are sent again one by one.
+    Up to max_workers requests are in flight at once; bullet_point_dict keeps the order of summarized_dict.
+    :param max_workers: Concurrent requests; 1 sends the requests one at a time.
+    :param on_partial: Optional callback on_partial(section, text_so_far) called as bullet points
+                       are streamed in. With max_workers > 1 it is called from worker threads.
+                       Sections of a batched request are reported once the whole request is done.
+    :param cache: Optional LLMCache for Mistral responses.
+    :param batch_tokens: Token budget of a batched request; 0 or None sends every section on its own.
+    :param client: MistralClient to send the requests with; defaults to the shared client.
     """
-    bullet_point_dict = {}
+    sections = list(summarized_dict)
+
+    def bullet_points_for(section):
+        summary = summarized_dict[section]
+        if on_partial is None:
+            return mistral_summarize(summary, client=client, cache=cache)
+        return mistral_summarize(summary, client=client, on_partial=lambda text: on_partial(section, text), cache=cache)
+
+    def bullet_points_for_batch(batch):
+        if len(batch) == 1:
+            return {batch[0]: bullet_points_for(batch[0])}
+
+        batch_results = mistral_summarize_batch(
+            {str(i): summarized_dict[section] for i, section in enumerate(batch, 1)}, client=client, cache=cache)
+        results = {}
+        for i, section in enumerate(batch, 1):
+            bullet_points = batch_results.get(str(i))
+            if bullet_points is None:
+                bullet_points = bullet_points_for(section)
+            elif on_partial is not None:
+                on_partial(section, bullet_points)
+            results[section] = bullet_points
+        return results
 
-    for section, summary in summarized_dict.items():
-        if summary:
-            bullet_points = mistral_summarize(summary)
-            if bullet_points:
-                bullet_point_dict[section] = bullet_points
-            else:
-                bullet_point_dict[section] = "No bullet points available"
-        print(f"Bullet points for section '{section}': {bullet_point_dict[section]}")
+    if batch_tokens:
+        batches = pack_sections(summarized_dict, batch_tokens, min_batches=max_workers)
+    else:
+        batches = [[section] for section in sections if summarized_dict[section]]
+
+    if max_workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches)), thread_name_prefix="mistral") as executor:
+            batch_results = list(executor.map(bullet_points_for_batch, batches))
+    else:
+        batch_results = [bullet_points_for_batch(batch) for batch in batches]
+
+    results = {}
+    for batch_result in batch_results:
+        results.update(batch_result)
+
+    bullet_point_dict = {}
+    for section in sections:
+        bullet_points = results.get(section)
+        if bullet_points:
+            bullet_point_dict[section] = bullet_points
+        else:
+            bullet_point_dict[section] = "No bullet points available"
+        logger.debug("Bullet points for section '%s': %s", section, bullet_point_dict[section])
     
     return bullet_point_dict
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     try:
         pdf_filename = 'Introduction to Module_ Neural Networks-1-3.pdf'
 
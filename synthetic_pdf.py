@@ -0,0 +1,204 @@
+import argparse
+import io
+import random
+import zlib
+from PIL import Image, ImageDraw
+
+PAGE_WIDTH = 612  # US Letter, in points
+PAGE_HEIGHT = 792
+MARGIN = 72
+BODY_FONT_SIZE = 10
+HEADING_FONT_SIZE = 18
+LINE_CHARS = 95  # Characters per body line at BODY_FONT_SIZE in Helvetica
+
+WORDS = (
+    "network neuron layer weight bias gradient descent training model data loss function activation "
+    "input output hidden learning rate batch epoch validation accuracy error signal feature vector "
+    "matrix value parameter optimization convergence sample label prediction classification regression "
+    "the a of and to in is that for with as on by this are be from an which can each its their"
+).split()
+
+class PdfWriter:
+    """
+    Just enough of a PDF writer for synthetic test documents: pages with Helvetica text
+    and JPEG or Flate-compressed RGB images. Objects are numbered in the order they are added.
+    """
+    def __init__(self):
+        self.objects = []  # Serialized object bodies; object n is self.objects[n - 1]
+        self.page_ids = []
+        self.pages_id = self.reserve()
+        self.font_id = self.add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    def reserve(self):
+        self.objects.append(None)
+        return len(self.objects)
+
+    def add(self, body):
+        self.objects.append(body)
+        return len(self.objects)
+
+    def add_stream(self, dictionary, data):
+        return self.add(b"<< " + dictionary + b" /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+
+    def add_image(self, image, image_format="jpeg"):
+        """
+        Add a PIL image as an image XObject and return its object id.
+        :param image_format: "jpeg" (DCTDecode) or "flate" (raw RGB, FlateDecode).
+        """
+        image = image.convert("RGB")
+        header = b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB /BitsPerComponent 8" \
+            % image.size
+        if image_format == "jpeg":
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=85)
+            return self.add_stream(header + b" /Filter /DCTDecode", buffer.getvalue())
+        if image_format == "flate":
+            return self.add_stream(header + b" /Filter /FlateDecode", zlib.compress(image.tobytes()))
+        raise ValueError(f"Unknown image format: {image_format}")
+
+    def add_page(self, content, images=None):
+        """
+        Add a page drawn by the content stream `content` (bytes).
+        :param images: Dictionary of XObject name (e.g. "Im1") to image object id used by the content.
+        """
+        xobjects = b"".join(b"/%s %d 0 R " % (name.encode(), image_id) for name, image_id in (images or {}).items())
+        content_id = self.add_stream(b"/Filter /FlateDecode", zlib.compress(content))
+        page_id = self.add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> /XObject << %s>> >> >>"
+            % (self.pages_id, PAGE_WIDTH, PAGE_HEIGHT, content_id, self.font_id, xobjects))
+        self.page_ids.append(page_id)
+        return page_id
+
+    def write(self, path):
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        self.objects[self.pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids))
+        catalog_id = self.add(b"<< /Type /Catalog /Pages %d 0 R >>" % self.pages_id)
+
+        output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for object_id, body in enumerate(self.objects, 1):
+            offsets.append(len(output))
+            output += b"%d 0 obj\n" % object_id + body + b"\nendobj\n"
+
+        xref_offset = len(output)
+        output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.objects) + 1)
+        for offset in offsets:
+            output += b"%010d 00000 n \n" % offset
+        output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" \
+            % (len(self.objects) + 1, catalog_id, xref_offset)
+
+        with open(path, "wb") as f:
+            f.write(output)
+
+def _text_line(text, font_size, y):
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return b"BT /F1 %d Tf %d %d Td (%s) Tj ET\n" % (font_size, MARGIN, y, escaped.encode("cp1252", "replace"))
+
+def _sentences(rng, word_count):
+    # Random sentences of 8-20 words, capitalized and ending with a period
+    words = []
+    while len(words) < word_count:
+        sentence = rng.choices(WORDS, k=rng.randint(8, 20))
+        sentence[0] = sentence[0].capitalize()
+        sentence[-1] += "."
+        words.extend(sentence)
+    return words[:word_count]
+
+def _wrap(words, line_chars=LINE_CHARS):
+    lines, current = [], ""
+    for word in words:
+        if current and len(current) + 1 + len(word) > line_chars:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+def _synthetic_image(rng, size):
+    # A smooth gradient with a few rectangles: compresses like a figure, not like noise
+    width, height = size
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(4):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randint(10, width // 2 + 10), y0 + rng.randint(10, height // 2 + 10)
+        draw.rectangle([x0, y0, x1, y1], fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return image
+
+def generate_pdf(path, pages=10, words_per_page=400, headings_per_page=2, images_per_page=0,
+                 image_size=(600, 400), image_format="jpeg", seed=0):
+    """
+    Write a synthetic PDF with controlled size and structure, for benchmarks.
+    Body text is set at BODY_FONT_SIZE and headings at HEADING_FONT_SIZE, so heading detection
+    finds one section per heading. Words that do not fit on a page are dropped.
+    :param pages: Number of pages.
+    :param words_per_page: Body words per page (at most about 600 fit).
+    :param headings_per_page: Headings per page; may be fractional (0.5 = one heading every other page).
+    :param images_per_page: Embedded images per page, drawn in a row at the bottom of the page.
+    :param image_size: Pixel size (width, height) of every image.
+    :param image_format: "jpeg" or "flate".
+    :param seed: Random seed; the same arguments always produce the same file.
+    """
+    rng = random.Random(seed)
+    writer = PdfWriter()
+    image_height = 0
+    if images_per_page:
+        image_width = (PAGE_WIDTH - 2 * MARGIN) / images_per_page - 10
+        image_height = image_width * image_size[1] / image_size[0]
+
+    heading_count = 0
+    headings_due = 0.0
+    for page_num in range(pages):
+        headings_due += headings_per_page
+        page_headings = int(headings_due)
+        headings_due -= page_headings
+
+        lines = _wrap(_sentences(rng, words_per_page))
+        # Spread the headings evenly over the page's lines
+        heading_positions = {round(i * len(lines) / page_headings) for i in range(page_headings)} if page_headings else set()
+
+        content = bytearray()
+        y = PAGE_HEIGHT - MARGIN
+        bottom = MARGIN + image_height + (10 if image_height else 0)
+        for line_num, line in enumerate(lines):
+            if line_num in heading_positions:
+                heading_count += 1
+                if y - HEADING_FONT_SIZE * 1.5 < bottom:
+                    break
+                y -= HEADING_FONT_SIZE * 1.5
+                content += _text_line(f"Section {heading_count} {rng.choice(WORDS).capitalize()}", HEADING_FONT_SIZE, y)
+            if y - BODY_FONT_SIZE * 1.2 < bottom:
+                break
+            y -= BODY_FONT_SIZE * 1.2
+            content += _text_line(line, BODY_FONT_SIZE, y)
+
+        images = {}
+        for i in range(images_per_page):
+            name = f"Im{i + 1}"
+            images[name] = writer.add_image(_synthetic_image(rng, image_size), image_format)
+            x = MARGIN + i * (image_width + 10)
+            content += b"q %.2f 0 0 %.2f %.2f %d cm /%s Do Q\n" % (image_width, image_height, x, MARGIN, name.encode())
+
+        writer.add_page(bytes(content), images)
+
+    writer.write(path)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic PDF for benchmarks.")
+    parser.add_argument("output", help="Path of the PDF to write.")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--headings-per-page", type=float, default=2)
+    parser.add_argument("--images-per-page", type=int, default=0)
+    parser.add_argument("--image-size", type=int, nargs=2, default=(600, 400), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--image-format", choices=("jpeg", "flate"), default="jpeg")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate_pdf(args.output, args.pages, args.words_per_page, args.headings_per_page, args.images_per_page,
+                 tuple(args.image_size), args.image_format, args.seed)
+    print(f"Wrote {args.output}")